@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from src.logging_config import LoggingSettings, configure_logging, flush_logging, log_node
+from src.tracing import start_trace
+
+SETTINGS = {
+    "sync": LoggingSettings(mode="sync"),
+    "async": LoggingSettings(mode="async"),
+    "json": LoggingSettings(mode="json"),
+    "async, sample 10%": LoggingSettings(mode="async", node_sample_rate=0.1),
+    "async, lp sample 10%": LoggingSettings(mode="async", node_sample_rate={"lp": 0.1}),
+    "async, max 50/s": LoggingSettings(mode="async", node_max_per_second=50),
+    "async, level INFO": LoggingSettings(mode="async", level="INFO"),
+}
+
+
+async def simulate_tree(num_main: int, num_sub: int) -> float:
+    """
+    Erzeugt dieselben Log-Meldungen wie ``generate_collections`` für einen Baum mit
+    ``num_main`` x ``num_sub`` Knoten und misst die Zeit, die der Event-Loop dafür im Logging verbringt.
+    """
+    spent = 0.0
+    with start_trace("benchmark"):
+        started = time.perf_counter()
+        logger.info("Request received. Starting topic tree generation for '{}' ({} x {} x {})", "Physik", 30, 20, 20)
+        logger.info("Generating {} main topics ('Hauptthemen') ...", num_main)
+        log_node("main", "Usage for '{}': prompt_tokens={}, cached_tokens={}, completion_tokens={}", "main", 1, 0, 1)
+        spent += time.perf_counter() - started
+        for i in range(num_main):
+            started = time.perf_counter()
+            log_node("sub", "Creating subtopic generation task for '{}'", f"Hauptthema {i}")
+            log_node("sub", "Usage for '{}': prompt_tokens={}, cached_tokens={}, completion_tokens={}", i, 1, 0, 1)
+            spent += time.perf_counter() - started
+            await asyncio.sleep(0)
+        for i in range(num_main * num_sub):
+            started = time.perf_counter()
+            log_node("lp", "Creating curriculum generation task for '{}'", f"Unterthema {i}")
+            log_node(
+                "lp",
+                "Usage for '{}': prompt_tokens={}, cached_tokens={}, completion_tokens={}",
+                i,
+                1,
+                0,
+                1,
+                severity="DEBUG",
+            )
+            spent += time.perf_counter() - started
+            await asyncio.sleep(0)
+    return spent
+
+
+class SlowStream:
+    """Stream mit künstlicher Latenz pro ``write`` (z.B. stderr als Pipe zu einem ausgelasteten Log-Collector)."""
+
+    def __init__(self, stream, latency_seconds: float):
+        self.stream = stream
+        self.latency_seconds = latency_seconds
+
+    def write(self, message: str) -> None:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        self.stream.write(message)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+async def run(
+    settings: LoggingSettings, sink_path: Path, latency_seconds: float, num_main: int, num_sub: int, repeat: int
+) -> float:
+    # zeilengepuffert, damit jede Meldung (wie bei stderr) einen eigenen write-Aufruf auslöst
+    with open(sink_path, "w", buffering=1, encoding="utf-8") as stream:
+        configure_logging(settings, sink=SlowStream(stream, latency_seconds))
+        timings = [await simulate_tree(num_main, num_sub) for _ in range(repeat)]
+        flush_logging()
+        logger.remove()
+    return statistics.median(timings)
+
+
+def main():
+    """
+    Misst, wie viel Event-Loop-Zeit das Logging der Knoten-Meldungen eines Themenbaums pro Einstellung kostet.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark für das Logging auf dem Generierungs-Pfad.")
+    parser.add_argument("--main", type=int, default=30, help="Anzahl der Hauptthemen (Standard: 30)")
+    parser.add_argument("--sub", type=int, default=20, help="Anzahl der Unterthemen pro Hauptthema (Standard: 20)")
+    parser.add_argument("--repeat", type=int, default=5, help="Anzahl der Wiederholungen (Standard: 5)")
+    parser.add_argument(
+        "--sink-latency-us",
+        type=float,
+        nargs="*",
+        default=[0, 50],
+        help="Simulierte Latenz pro Schreibvorgang des Sinks in µs (Standard: 0 und 50)",
+    )
+    args = parser.parse_args()
+
+    messages = 3 + 2 * args.main + 2 * args.main * args.sub
+    with tempfile.TemporaryDirectory() as tmp:
+        for latency_us in args.sink_latency_us:
+            print(
+                f"--- Logging-Benchmark: {args.main} x {args.sub} Knoten, {messages} Meldungen pro Baum, "
+                f"Sink-Latenz {latency_us:g} µs ---"
+            )
+            for name, settings in SETTINGS.items():
+                seconds = asyncio.run(
+                    run(settings, Path(tmp) / "bench.log", latency_us / 1e6, args.main, args.sub, args.repeat)
+                )
+                print(
+                    f"{name:<20} {seconds * 1000:8.2f} ms Event-Loop-Zeit pro Baum ({seconds / messages * 1e6:6.1f} µs/Meldung)"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# läuft in einem frischen Interpreter: Import von ``main``, danach ``lifespan`` bis ``/_ready`` "ok" meldet
+CHILD = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+lazy = {name: name not in sys.modules for name in ("openai", "requests")}
+
+async def wait_ready():
+    async with main.app.router.lifespan_context(main.app):
+        while not main.warmup.ready:
+            await asyncio.sleep(0.005)
+
+asyncio.run(wait_ready())
+print(json.dumps({
+    "import_main": imported - started,
+    "ready": time.perf_counter() - started,
+    "steps": main.warmup.steps,
+    "lazy": lazy,
+}))
+"""
+
+
+def run_once(env: dict) -> dict:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process"] = time.perf_counter() - started
+    return timings
+
+
+def main():
+    """
+    Misst in frischen Prozessen die Zeit bis ``import main`` abgeschlossen ist (ab dann antwortet ``/_ping``)
+    und bis das Warm-up fertig ist (ab dann meldet ``/_ready`` "ok").
+    """
+    parser = argparse.ArgumentParser(description="Benchmark für Start und Warm-up des Servers.")
+    parser.add_argument("--repeat", type=int, default=5, help="Anzahl der Prozessstarts (Standard: 5)")
+    parser.add_argument(
+        "--with-openai-connections",
+        action="store_true",
+        help="Verbindungen zur OpenAI-API im Warm-up öffnen (benötigt OPENAI_API_KEY; Standard: aus)",
+    )
+    args = parser.parse_args()
+
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+    if not args.with_openai_connections:
+        env["WARMUP_OPENAI_CONNECTIONS"] = "0"
+
+    # erster Lauf nur zum Füllen von Bytecode- und Dateisystem-Cache
+    run_once(env)
+    runs = [run_once(env) for _ in range(args.repeat)]
+
+    print(f"--- Start-Benchmark: Median über {args.repeat} Prozessstarts ---")
+    for key, label in (
+        ("import_main", "import main (/_ping)"),
+        ("ready", "bis /_ready ok"),
+        ("process", "Prozess gesamt"),
+    ):
+        print(f"{label:<24} {statistics.median(r[key] for r in runs) * 1000:8.1f} ms")
+    for step in runs[0]["steps"]:
+        seconds = statistics.median(r["steps"].get(step, 0.0) for r in runs)
+        print(f"  Warm-up: {step:<15} {seconds * 1000:8.1f} ms")
+    print(f"Erst im Warm-up importiert: {', '.join(name for name, lazy in runs[0]['lazy'].items() if lazy) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
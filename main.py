@@ -1,18 +1,21 @@
-import asyncio
-import os
-from datetime import datetime
+from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from loguru import logger
-from openai import AsyncOpenAI
 
-from src.DTOs.collection import Collection
 from src.DTOs.ping import Ping
-from src.DTOs.properties import Properties
+from src.DTOs.readiness import Readiness
+from src.DTOs.topic_tree_plan import TopicTreePlan
 from src.DTOs.topic_tree_request import TopicTreeRequest
-from src.prompts import MAIN_PROMPT_TEMPLATE, SUB_PROMPT_TEMPLATE, LP_PROMPT_TEMPLATE
-from src.structured_text_helper import generate_structured_text, generate_structured_text_async
+from src.logging_config import configure_logging, flush_logging
+from src.model_router import ModelMetrics, get_model_router
+from src.openai_client import get_openai_client, get_openai_key
+from src.popular_tree_cache import PopularTreeCache
+from src.topic_tree_generator import build_topic_tree, generate_collections
+from src.topic_tree_planner import plan_topic_tree
+from src.tracing import start_trace
+from src.warmup import Warmup
 
 # ToDo: replace / remove unnecessary dependencies
 #  - replace "backoff" dependency since its unmaintained / abandonware
@@ -30,17 +33,27 @@ from src.structured_text_helper import generate_structured_text, generate_struct
 #  - either use German as our domain language for everything
 #  - or properly translate everything to English
 
+# ``load_dotenv()`` muss vor allen ``from_env()``-Aufrufen laufen (auch vor ``configure_logging()``) und ist billig;
+# alles Teure (``openai``-Import, Client, Schemas, Verbindungen) übernimmt das Warm-up im ``lifespan``
 load_dotenv()
+configure_logging()
 
+# Vorberechnung häufig angefragter Themenbäume (deaktiviert, solange PRECOMPUTE_TOP_N nicht gesetzt ist)
+popular_tree_cache = PopularTreeCache.from_env()
+# Warm-up nach dem Start, ``/_ready`` meldet erst danach "ok"
+warmup = Warmup.from_env()
 
-def get_openai_key():
-    """Liest den OpenAI-API-Key aus den Umgebungsvariablen."""
-    return os.getenv("OPENAI_API_KEY", "")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    popular_tree_cache.start(client_factory=get_openai_client)
+    warmup.start(app, extra_steps={"precomputed_trees": popular_tree_cache.wait_loaded})
+    yield
+    await warmup.stop()
+    await popular_tree_cache.stop()
+    # noch in der Queue liegende Log-Meldungen schreiben (LOG_MODE=async/json)
+    flush_logging()
 
-# Erlaubt, dass das Collection-Modell sich selbst referenziert (subcollections)
-Collection.model_rebuild()
-# ToDo: figure out why model_rebuild() is called here
 
 # ------------------------------------------------------------------------------
 # 7) FastAPI App
@@ -72,6 +85,7 @@ app = FastAPI(
     version="1.0.0",
     contact={"name": "Themenbaum Generator Support", "email": "support@example.com"},
     license_info={"name": "Proprietär", "url": "https://example.com/license"},
+    lifespan=lifespan,
 )
 # ToDo: set (valid) contact / license information
 
@@ -139,7 +153,7 @@ app = FastAPI(
     },
     tags=["Themenbaum-Generator"],
 )
-async def generate_topic_tree(topic_tree_request: TopicTreeRequest):
+async def generate_topic_tree(topic_tree_request: TopicTreeRequest, response: Response):
     """
     Generiert einen strukturierten Themenbaum basierend auf den Eingabeparametern.
 
@@ -151,133 +165,63 @@ async def generate_topic_tree(topic_tree_request: TopicTreeRequest):
     - ``include_methodology_topic``: Falls True, fügt ein Hauptthema "Methodik und Didaktik" hinzu
     - ``discipline_uri``: Falls übergeben, tauchen diese URIs in den ``ccm:taxonid``-Properties auf (hat **keinen** Effekt auf die Generierung)
     - ``educational_context_uri``: Falls übergeben, taucht diese URI in den ``ccm:educationalcontext``-Properties auf (hat **keinen** Effekt auf die Generierung)
+
+    Die Trace-ID der Anfrage wird im Header ``X-Trace-Id`` zurückgegeben (auch bei Fehlern).
     """
+    with start_trace(
+        "generate_topic_tree",
+        theme=topic_tree_request.theme,
+        num_main_topics=topic_tree_request.num_main_topics,
+        num_subtopics=topic_tree_request.num_subtopics,
+        num_curriculum_topics=topic_tree_request.num_curriculum_topics,
+    ) as trace:
+        response.headers["X-Trace-Id"] = trace.trace_id
+        try:
+            return await _generate_topic_tree(topic_tree_request)
+        except HTTPException as e:
+            # die Header von ``response`` gehen bei einer Exception verloren
+            raise HTTPException(
+                status_code=e.status_code, detail=e.detail, headers={**(e.headers or {}), "X-Trace-Id": trace.trace_id}
+            ) from e
+
+
+async def _generate_topic_tree(topic_tree_request: TopicTreeRequest) -> dict:
     logger.info(
-        f"Request received. Starting OpenAI chat completion request with the following settings: {topic_tree_request}"
+        "Request received. Starting topic tree generation for '{}' ({} x {} x {})",
+        topic_tree_request.theme,
+        topic_tree_request.num_main_topics,
+        topic_tree_request.num_subtopics,
+        topic_tree_request.num_curriculum_topics,
     )
-    # 1) OpenAI-Key holen
+    logger.opt(lazy=True).debug("Request settings: {}", lambda: topic_tree_request)
+    # 1) vorberechneten Baum ausliefern (falls vorhanden)
+    popular_tree_cache.record(topic_tree_request)
+    cached_collections = popular_tree_cache.get(topic_tree_request)
+    if cached_collections is not None:
+        logger.info("Serving precomputed topic tree.")
+        return build_topic_tree(cached_collections, topic_tree_request)
+
+    # 2) OpenAI-Key holen
     openai_key = get_openai_key()
     if not openai_key:
         raise HTTPException(status_code=500, detail="OpenAI API Key nicht gefunden")
 
     try:
-        client = AsyncOpenAI(api_key=get_openai_key())
+        client = get_openai_client()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OpenAI-Init-Fehler: {str(e)}")
 
     try:
-        # 2) Spezialanweisungen für Hauptthemen (z.B. Allgemeines, Methodik etc.)
-        special_instructions = []
-        if topic_tree_request.include_general_topic:
-            special_instructions.append("1) Hauptthema 'Allgemeines' an erster Stelle")
-        if topic_tree_request.include_methodology_topic:
-            special_instructions.append("2) Hauptthema 'Methodik und Didaktik' an letzter Stelle")
-        special_instructions = (
-            "\n".join(special_instructions) if special_instructions else "Keine besonderen Anweisungen."
-        )
-
-        logger.info(f"Generating {topic_tree_request.num_main_topics} main topics ('Hauptthemen') ...")
-
-        # 3) Hauptthemen generieren
-        main_topics = await generate_structured_text_async(
-            client=client,
-            prompt=MAIN_PROMPT_TEMPLATE.format(
-                themenbaumthema=topic_tree_request.theme,
-                num_main=topic_tree_request.num_main_topics,
-                existing_titles="",
-                special_instructions=special_instructions,
-            ),
-            model=topic_tree_request.model,
-        )
+        # 3) Haupt-, Unter- und Lehrplanthemen generieren
+        main_topics = await generate_collections(client, topic_tree_request)
 
         if not main_topics:
             raise HTTPException(status_code=500, detail="Fehler bei der Generierung der Hauptthemen")
 
-        logger.info("Received main topics ('Hauptthemen'). Beginning generation of sub topics ('Unterthemen') next.")
-
-        # 4) Unterthemen für jedes Hauptthema asynchron generieren
-        sub_topic_tasks = []
-        for main_topic in main_topics:
-            logger.info(f"Creating subtopic generation task for '{main_topic.title}'")
-            prompt = SUB_PROMPT_TEMPLATE.format(
-                themenbaumthema=topic_tree_request.theme,
-                main_theme=main_topic.title,
-                num_sub=topic_tree_request.num_subtopics,
-            )
-            task = generate_structured_text_async(client=client, prompt=prompt, model=topic_tree_request.model)
-            sub_topic_tasks.append(task)
-
-        sub_topics_results = await asyncio.gather(*sub_topic_tasks)
-
-        for i, main_topic in enumerate(main_topics):
-            sub_topics = sub_topics_results[i]
-            if sub_topics:
-                main_topic.subcollections = sub_topics
-
-        # 5) Lehrplanthemen für jedes Unterthema asynchron generieren
-        lp_tasks = []
-        for main_topic in main_topics:
-            for sub_topic in main_topic.subcollections:
-                logger.info(f"Creating curriculum generation task for '{sub_topic.title}'")
-                prompt = LP_PROMPT_TEMPLATE.format(
-                    themenbaumthema=topic_tree_request.theme,
-                    main_theme=main_topic.title,
-                    sub_theme=sub_topic.title,
-                    num_lp=topic_tree_request.num_curriculum_topics,
-                )
-                task = generate_structured_text_async(client=client, prompt=prompt, model=topic_tree_request.model)
-                lp_tasks.append((main_topic, sub_topic, task))
-
-        lp_results = await asyncio.gather(*[task for _, _, task in lp_tasks])
-
-        for i, (main_topic, sub_topic, _) in enumerate(lp_tasks):
-            lp_topics = lp_results[i]
-            if lp_topics:
-                sub_topic.subcollections = lp_topics
-
-        # 6) Properties für alle Knoten nochmal updaten mit den (ggf.) übergebenen URIs
-        for main_topic in main_topics:
-            main_topic.properties = Properties(
-                cm_title=[main_topic.title],
-                ccm_collectionshorttitle=[main_topic.shorttitle],
-                cm_description=main_topic.properties.cm_description,
-                cclom_general_keyword=main_topic.properties.cclom_general_keyword,
-                ccm_taxonid=main_topic.properties.ccm_taxonid,
-                ccm_educationalcontext=main_topic.properties.ccm_educationalcontext,
-            )
-
-            for sub_topic in main_topic.subcollections:
-                sub_topic.properties = Properties(
-                    cm_title=[sub_topic.title],
-                    ccm_collectionshorttitle=[sub_topic.shorttitle],
-                    cm_description=sub_topic.properties.cm_description,
-                    cclom_general_keyword=sub_topic.properties.cclom_general_keyword,
-                    ccm_taxonid=sub_topic.properties.ccm_taxonid,
-                    ccm_educationalcontext=sub_topic.properties.ccm_educationalcontext,
-                )
-
-                for lp_topic in sub_topic.subcollections:
-                    lp_topic.properties = Properties(
-                        cm_title=[lp_topic.title],
-                        ccm_collectionshorttitle=[lp_topic.shorttitle],
-                        cm_description=lp_topic.properties.cm_description,
-                        cclom_general_keyword=lp_topic.properties.cclom_general_keyword,
-                        ccm_taxonid=lp_topic.properties.ccm_taxonid,
-                        ccm_educationalcontext=lp_topic.properties.ccm_educationalcontext,
-                    )
-
-        # 7) Finale Daten strukturieren (Metadaten + Collection-Liste)
-        final_data = {
-            "metadata": {
-                "title": topic_tree_request.theme,
-                "description": f"Themenbaum für {topic_tree_request.theme}",
-                "target_audience": "Lehrkräfte",
-                "created_at": datetime.now().isoformat(),
-                "version": "1.0",
-                "author": "Themenbaum Generator",
-            },
-            "collection": [topic.to_dict() for topic in main_topics],
-        }
+        popular_tree_cache.put(topic_tree_request, main_topics)
+
+        # 4) URIs setzen und finale Daten strukturieren (Metadaten + Collection-Liste)
+        final_data = build_topic_tree(main_topics, topic_tree_request)
 
         # ToDo: actually return a JSON object (instead of a python dict) as soon as you're done with debugging
         return final_data
@@ -287,12 +231,50 @@ async def generate_topic_tree(topic_tree_request: TopicTreeRequest):
         raise HTTPException(status_code=500, detail=f"Fehler bei der Generierung: {str(e)}")
 
 
+@app.post(
+    "/generate-topic-tree/plan",
+    response_model=TopicTreePlan,
+    summary="Schätze den Aufwand eines Themenbaums (Probelauf)",
+    description="""
+    Schätzt für die übergebenen Parameter, ohne das Sprachmodell aufzurufen:
+
+    - die Anzahl der Chat-Completion-Aufrufe pro Ebene (Haupt-, Unter- und Lehrplanthemen)
+    - die Prompt- und Completion-Tokens (aus der Prompt-Länge und bisher gemessenen ``resp.usage``-Werten)
+    - die voraussichtliche Dauer unter der konfigurierten Nebenläufigkeit und den Rate-Limits
+
+    Die Schätzung kann z.B. genutzt werden, um zu große Anfragen abzulehnen oder einzureihen.
+    """,
+    tags=["Themenbaum-Generator"],
+)
+async def plan_topic_tree_endpoint(topic_tree_request: TopicTreeRequest):
+    return plan_topic_tree(topic_tree_request, served_from_cache=popular_tree_cache.contains(topic_tree_request))
+
+
 @app.get(path="/_ping", response_model=Ping, tags=["health check"])
 async def ping_endpoint():
     """Ping function for Kubernetes health checks."""
     return Ping(status="ok")
 
 
+@app.get(
+    path="/_ready",
+    response_model=Readiness,
+    tags=["health check"],
+    responses={503: {"model": Readiness, "description": "Das Warm-up nach dem Start läuft noch"}},
+)
+async def ready_endpoint(response: Response):
+    """Readiness check for Kubernetes: 503 until the warm-up after startup has finished, then 'ok'."""
+    if not warmup.ready:
+        response.status_code = 503
+    return warmup.readiness()
+
+
+@app.get(path="/_model-metrics", response_model=list[ModelMetrics], tags=["health check"])
+async def model_metrics_endpoint():
+    """Beobachtete Latenz, Fehlerquote und Auslastung pro Modell (Grundlage für das Routing pro Ebene)."""
+    return get_model_router().metrics()
+
+
 @app.get(path="/", include_in_schema=False)
 async def root_endpoint():
     return {
@@ -0,0 +1,17 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+
+class Readiness(BaseModel):
+    status: str = Field(
+        default="warming up",
+        description="Readiness of the server. Is 'ok' as soon as the warm-up after startup has finished.",
+        examples=["warming up", "ok"],
+    )
+    warmup_seconds: Optional[float] = Field(None, description="Dauer des Warm-ups in Sekunden (sobald abgeschlossen)")
+    steps: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Dauer der einzelnen Warm-up-Schritte in Sekunden",
+        examples=[{"import_openai": 0.61, "schemas": 0.05, "openai_connections": 0.32}],
+    )
@@ -0,0 +1,50 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from src.llm_limits import LlmLimits
+
+
+class LevelPlan(BaseModel):
+    """
+    Geschätzter Aufwand einer Ebene des Themenbaums (Haupt-, Unter- oder Lehrplanthemen).
+    """
+
+    level: str = Field(description="Ebene des Themenbaums: 'main', 'sub' oder 'lp'", examples=["sub"])
+    model: str = Field(
+        description="Modell, an das die Aufrufe dieser Ebene aktuell geleitet werden", examples=["gpt-4.1-mini"]
+    )
+    calls: int = Field(description="Anzahl der Chat-Completion-Aufrufe auf dieser Ebene", examples=[5])
+    input_tokens: int = Field(description="Geschätzte Prompt-Tokens aller Aufrufe dieser Ebene", examples=[7500])
+    output_tokens: int = Field(description="Geschätzte Completion-Tokens aller Aufrufe dieser Ebene", examples=[1500])
+    estimated_seconds: float = Field(description="Geschätzte Dauer der Ebene in Sekunden", examples=[6.5])
+
+
+class TopicTreePlan(BaseModel):
+    """
+    Ergebnis eines Probelaufs (dry run): geschätzter Aufwand eines Themenbaums, ohne das LLM aufzurufen.
+    """
+
+    levels: List[LevelPlan] = Field(
+        description="Geschätzter Aufwand einer (Neu-)Generierung pro Ebene, auch wenn der Baum vorberechnet vorliegt"
+    )
+    total_calls: int = Field(
+        description="Anzahl aller Chat-Completion-Aufrufe dieser Anfrage (0, falls vorberechnet)", examples=[21]
+    )
+    total_input_tokens: int = Field(
+        description="Geschätzte Prompt-Tokens dieser Anfrage insgesamt (0, falls vorberechnet)", examples=[31500]
+    )
+    total_output_tokens: int = Field(
+        description="Geschätzte Completion-Tokens dieser Anfrage insgesamt (0, falls vorberechnet)", examples=[6300]
+    )
+    estimated_seconds: float = Field(
+        description="Geschätzte Gesamtdauer (Wall-Clock) dieser Anfrage in Sekunden (0, falls vorberechnet)",
+        examples=[18.2],
+    )
+    limits: LlmLimits = Field(description="Zugrunde gelegte Nebenläufigkeit und Rate-Limits")
+    based_on_history: bool = Field(
+        description="True, falls die Schätzung auf bereits gemessenen Aufrufen (``resp.usage``) basiert"
+    )
+    served_from_cache: bool = Field(
+        False, description="True, falls der Themenbaum vorberechnet vorliegt und ohne LLM-Aufrufe ausgeliefert wird"
+    )
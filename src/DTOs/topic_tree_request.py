@@ -2,6 +2,9 @@ from typing import Optional, List
 
 from pydantic import BaseModel, Field
 
+# Modell, falls weder ``model`` gesetzt noch für die Ebene eine Route (``MODEL_ROUTES``) konfiguriert ist
+DEFAULT_MODEL = "gpt-4.1-mini"
+
 
 class TopicTreeRequest(BaseModel):
     """
@@ -47,4 +50,9 @@ class TopicTreeRequest(BaseModel):
         ],
     )
 
-    model: str = Field("gpt-4.1-mini", description="Das zu verwendende OpenAI-Sprachmodell", examples=["gpt-4.1-mini"])
+    model: Optional[str] = Field(
+        None,
+        description="Das zu verwendende OpenAI-Sprachmodell für alle Ebenen. Ohne Angabe (``null``) gilt die "
+        f"serverseitige Modell-Konfiguration pro Ebene (``MODEL_ROUTES``) mit ``{DEFAULT_MODEL}`` als Default.",
+        examples=[None, DEFAULT_MODEL],
+    )
@@ -0,0 +1,51 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class LlmLimits(BaseModel):
+    """
+    Konfigurierte Grenzen für die Chat-Completion-Aufrufe (0 = unbegrenzt).
+
+    ``max_concurrency`` wird von ``llm_slot`` durchgesetzt. ``requests_per_minute`` und ``tokens_per_minute``
+    entsprechen den Rate-Limits des OpenAI-Accounts und werden vom Planer für die Zeitschätzung verwendet.
+    """
+
+    max_concurrency: int = Field(0, ge=0, description="Maximale Anzahl gleichzeitiger Chat-Completion-Aufrufe")
+    requests_per_minute: int = Field(0, ge=0, description="Rate-Limit des Providers (Requests pro Minute)")
+    tokens_per_minute: int = Field(0, ge=0, description="Rate-Limit des Providers (Tokens pro Minute)")
+
+    @classmethod
+    def from_env(cls) -> "LlmLimits":
+        return cls(
+            max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "0")),
+            requests_per_minute=int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "0")),
+            tokens_per_minute=int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "0")),
+        )
+
+
+@lru_cache
+def get_llm_limits() -> LlmLimits:
+    """Liest die Grenzen beim ersten Zugriff (also nach ``load_dotenv()``) aus den Umgebungsvariablen."""
+    return LlmLimits.from_env()
+
+
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+@asynccontextmanager
+async def llm_slot():
+    """Begrenzt die Anzahl gleichzeitiger Chat-Completion-Aufrufe prozessweit auf ``max_concurrency``."""
+    global _semaphore
+    max_concurrency = get_llm_limits().max_concurrency
+    if not max_concurrency:
+        yield
+        return
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max_concurrency)
+    async with _semaphore:
+        yield
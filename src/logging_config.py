@@ -0,0 +1,155 @@
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Annotated, Dict, Optional, Union
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | {extra[trace_id]} - <level>{message}</level>"
+)
+
+
+SampleRate = Annotated[float, Field(ge=0.0, le=1.0)]
+MaxPerSecond = Annotated[int, Field(ge=0)]
+
+
+class LoggingSettings(BaseModel):
+    """
+    Einstellungen für das Logging (``LOG_*``-Umgebungsvariablen).
+
+    - ``mode``: ``sync`` (direkt nach stderr), ``async`` (Queue + Hintergrund-Thread, siehe ``QueueSink``)
+      oder ``json`` (wie ``async``, aber ein JSON-Objekt pro Zeile inkl. ``trace_id``)
+    - ``node_sample_rate`` / ``node_max_per_second``: Sampling bzw. Rate-Limit der Log-Meldungen pro Knoten,
+      entweder ein Wert für alle Ebenen oder pro Ebene (``main``, ``sub``, ``lp``), z.B.
+      ``LOG_NODE_SAMPLE_RATE='{"lp": 0.1}'``; nicht aufgeführte Ebenen werden nicht gesampelt bzw. begrenzt.
+      Das Rate-Limit gilt immer getrennt je Ebene.
+    """
+
+    mode: str = Field("sync", pattern="^(sync|async|json)$")
+    level: str = "DEBUG"
+    node_sample_rate: Union[SampleRate, Dict[str, SampleRate]] = 1.0
+    node_max_per_second: Union[MaxPerSecond, Dict[str, MaxPerSecond]] = Field(0, description="0 = unbegrenzt")
+
+    @classmethod
+    def from_env(cls) -> "LoggingSettings":
+        return cls(
+            mode=os.getenv("LOG_MODE", "sync"),
+            level=os.getenv("LOG_LEVEL", "DEBUG"),
+            # Zahl oder JSON-Objekt pro Ebene
+            node_sample_rate=json.loads(os.getenv("LOG_NODE_SAMPLE_RATE") or "1.0"),
+            node_max_per_second=json.loads(os.getenv("LOG_NODE_MAX_PER_SECOND") or "0"),
+        )
+
+    def sample_rate(self, tree_level: str) -> float:
+        if isinstance(self.node_sample_rate, dict):
+            return self.node_sample_rate.get(tree_level, 1.0)
+        return self.node_sample_rate
+
+    def max_per_second(self, tree_level: str) -> int:
+        if isinstance(self.node_max_per_second, dict):
+            return self.node_max_per_second.get(tree_level, 0)
+        return self.node_max_per_second
+
+
+class QueueSink:
+    """
+    loguru-Sink, der die fertig formatierten Meldungen nur in eine Thread-Queue legt;
+    ein Hintergrund-Thread schreibt sie in den eigentlichen Stream.
+
+    Im Gegensatz zu ``enqueue=True`` von loguru (``multiprocessing``-Queue, pickelt jeden Record)
+    kostet das auf dem Event-Loop nur ein ``queue.put``.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        self._queue.put(message)
+
+    def _run(self) -> None:
+        while True:
+            message = self._queue.get()
+            try:
+                if message is None:
+                    return
+                self.stream.write(message)
+                if self._queue.empty():
+                    self.stream.flush()
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Blockiert, bis alle bisher eingereihten Meldungen geschrieben wurden."""
+        self._queue.join()
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+
+_settings = LoggingSettings()
+_queue_sink: Optional[QueueSink] = None
+# pro Ebene: (Beginn des aktuellen Sekundenfensters, Anzahl Meldungen im Fenster)
+_node_windows: Dict[str, list] = {}
+
+
+def configure_logging(settings: Optional[LoggingSettings] = None, sink=sys.stderr) -> None:
+    """
+    Ersetzt den Standard-Handler von loguru. Im Modus ``async`` / ``json`` schreibt ein Hintergrund-Thread
+    in den Sink, der Event-Loop legt die Meldungen nur in eine Queue (siehe ``QueueSink``).
+    """
+    global _settings, _queue_sink
+    _settings = settings or LoggingSettings.from_env()
+    _node_windows.clear()
+    logger.remove()
+    if _queue_sink is not None:
+        _queue_sink.stop()
+        _queue_sink = None
+    logger.configure(extra={"trace_id": "-"})
+    if _settings.mode in ("async", "json"):
+        _queue_sink = QueueSink(sink)
+        sink = _queue_sink.write
+    logger.add(
+        sink,
+        level=_settings.level,
+        format=TEXT_FORMAT,
+        serialize=_settings.mode == "json",
+        colorize=None if _settings.mode == "sync" else False,
+    )
+
+
+def flush_logging() -> None:
+    """Schreibt alle noch in der Queue liegenden Meldungen (``LOG_MODE=async`` / ``json``)."""
+    if _queue_sink is not None:
+        _queue_sink.flush()
+
+
+def log_node(tree_level: str, message: str, *args, severity: str = "INFO") -> None:
+    """
+    Log-Meldung für einen einzelnen Knoten (z.B. "Creating curriculum generation task for ...").
+    Wird mit der Rate der Ebene gesampelt bzw. auf deren ``node_max_per_second`` begrenzt; ``message`` wird
+    (wie bei loguru üblich) erst nach diesen Prüfungen mit ``args`` formatiert.
+    """
+    sample_rate = _settings.sample_rate(tree_level)
+    if sample_rate < 1.0 and random.random() >= sample_rate:
+        return
+    max_per_second = _settings.max_per_second(tree_level)
+    if max_per_second:
+        now = time.monotonic()
+        window = _node_windows.setdefault(tree_level, [now, 0])
+        if now - window[0] >= 1.0:
+            window[0], window[1] = now, 0
+        if window[1] >= max_per_second:
+            return
+        window[1] += 1
+    logger.opt(depth=1).log(severity, message, *args)
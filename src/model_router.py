@@ -0,0 +1,237 @@
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from src.DTOs.topic_tree_request import DEFAULT_MODEL, TopicTreeRequest
+
+
+class ModelMetrics(BaseModel):
+    """Beobachtete Kennzahlen eines Modells (über die letzten ``window_size`` Aufrufe)."""
+
+    model: str
+    calls: int = Field(description="Anzahl aller Aufrufe seit Prozessstart")
+    errors: int = Field(description="Anzahl fehlgeschlagener Aufrufe seit Prozessstart")
+    in_flight: int = Field(description="Anzahl gerade laufender Aufrufe")
+    max_concurrency: int = Field(description="Maximale Anzahl gleichzeitiger Aufrufe (0 = unbegrenzt)")
+    error_rate: float = Field(description="Fehlerquote im aktuellen Fenster")
+    p50_latency_seconds: Optional[float] = Field(None, description="Median der Latenz im aktuellen Fenster")
+    p95_latency_seconds: Optional[float] = Field(None, description="95. Perzentil der Latenz im aktuellen Fenster")
+    healthy: bool = Field(description="False, solange das Modell wegen Latenz / Fehlerquote übersprungen wird")
+
+
+class _ModelState:
+    def __init__(self, window_size: int, max_concurrency: int):
+        self.window: Deque[Tuple[float, bool]] = deque(maxlen=window_size)
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.tripped_at: Optional[float] = None
+
+    def p95_latency(self) -> Optional[float]:
+        latencies = [latency for latency, ok in self.window if ok]
+        if len(latencies) < 2:
+            return latencies[0] if latencies else None
+        return statistics.quantiles(latencies, n=20)[-1]
+
+    def p50_latency(self) -> Optional[float]:
+        latencies = [latency for latency, ok in self.window if ok]
+        return statistics.median(latencies) if latencies else None
+
+    def error_rate(self) -> float:
+        if not self.window:
+            return 0.0
+        return sum(1 for _, ok in self.window if not ok) / len(self.window)
+
+
+class ModelRouter:
+    """
+    Wählt pro Ebene (``main``, ``sub``, ``lp``) das Modell aus einer geordneten Fallback-Kette.
+
+    Überschreitet ein Modell die Latenz- (p95) oder Fehlerquoten-Schwelle, werden neue Aufrufe an das nächste
+    Modell der Kette geleitet. Nach ``cooldown_seconds`` wird das Modell mit leerem Fenster erneut versucht.
+    Zusätzlich begrenzt der Router die gleichzeitigen Aufrufe pro Modell und sammelt Kennzahlen.
+    """
+
+    def __init__(
+        self,
+        routes: Optional[Dict[str, List[str]]] = None,
+        max_concurrency: Optional[Dict[str, int]] = None,
+        latency_threshold_seconds: float = 0,
+        error_rate_threshold: float = 0,
+        window_size: int = 50,
+        min_samples: int = 10,
+        cooldown_seconds: float = 60,
+    ):
+        self.routes = routes or {}
+        self.max_concurrency = max_concurrency or {}
+        self.latency_threshold_seconds = latency_threshold_seconds
+        self.error_rate_threshold = error_rate_threshold
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.cooldown_seconds = cooldown_seconds
+        self._states: Dict[str, _ModelState] = {}
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """
+        Liest die Konfiguration aus den Umgebungsvariablen, z.B.:
+
+        - ``MODEL_ROUTES='{"main": ["gpt-4.1"], "lp": ["gpt-4.1-nano", "gpt-4.1-mini"]}'``
+        - ``MODEL_MAX_CONCURRENCY='{"gpt-4.1": 5, "gpt-4.1-nano": 50}'``
+        - ``MODEL_LATENCY_THRESHOLD_SECONDS`` (p95, 0 = aus), ``MODEL_ERROR_RATE_THRESHOLD`` (0.0 bis 1.0, 0 = aus)
+        - ``MODEL_WINDOW_SIZE``, ``MODEL_MIN_SAMPLES``, ``MODEL_COOLDOWN_SECONDS``
+        """
+        return cls(
+            routes=json.loads(os.getenv("MODEL_ROUTES") or "{}"),
+            max_concurrency=json.loads(os.getenv("MODEL_MAX_CONCURRENCY") or "{}"),
+            latency_threshold_seconds=float(os.getenv("MODEL_LATENCY_THRESHOLD_SECONDS", "0")),
+            error_rate_threshold=float(os.getenv("MODEL_ERROR_RATE_THRESHOLD", "0")),
+            window_size=int(os.getenv("MODEL_WINDOW_SIZE", "50")),
+            min_samples=int(os.getenv("MODEL_MIN_SAMPLES", "10")),
+            cooldown_seconds=float(os.getenv("MODEL_COOLDOWN_SECONDS", "60")),
+        )
+
+    def _state(self, model: str) -> _ModelState:
+        if model not in self._states:
+            self._states[model] = _ModelState(self.window_size, self.max_concurrency.get(model, 0))
+        return self._states[model]
+
+    def chain(self, level: str, topic_tree_request: TopicTreeRequest) -> List[str]:
+        """
+        Fallback-Kette einer Ebene. Enthält die Anfrage ein ``model``, wird ausschließlich dieses Modell verwendet,
+        sonst die konfigurierte Kette (bzw. ``DEFAULT_MODEL``).
+        """
+        if topic_tree_request.model:
+            return [topic_tree_request.model]
+        return self.routes.get(level) or [DEFAULT_MODEL]
+
+    def _is_cooling_down(self, state: _ModelState, now: float) -> bool:
+        """True, solange ein ausgelöstes Modell übersprungen wird (``cooldown_seconds`` noch nicht vorbei)."""
+        return state.tripped_at is not None and now - state.tripped_at < self.cooldown_seconds
+
+    def _exceeds_thresholds(self, state: _ModelState) -> bool:
+        if len(state.window) < self.min_samples:
+            return False
+        too_slow = self.latency_threshold_seconds and (state.p95_latency() or 0) > self.latency_threshold_seconds
+        too_faulty = self.error_rate_threshold and state.error_rate() > self.error_rate_threshold
+        return bool(too_slow or too_faulty)
+
+    def is_healthy(self, model: str) -> bool:
+        state = self._state(model)
+        if state.tripped_at is not None:
+            if self._is_cooling_down(state, time.time()):
+                return False
+            # Cooldown vorbei: Modell erneut versuchen, alte Messwerte verwerfen
+            state.tripped_at = None
+            state.window.clear()
+        if self._exceeds_thresholds(state):
+            state.tripped_at = time.time()
+            logger.warning(
+                f"Model '{model}' exceeded its thresholds (p95: {state.p95_latency()}, "
+                f"error rate: {state.error_rate():.2f}), routing to fallback for {self.cooldown_seconds}s"
+            )
+            return False
+        return True
+
+    def select(self, level: str, topic_tree_request: TopicTreeRequest) -> str:
+        """Erstes gesundes Modell der Kette; sind alle über der Schwelle, das letzte (Fallback) Modell."""
+        chain = self.chain(level, topic_tree_request)
+        for model in chain:
+            if self.is_healthy(model):
+                return model
+        return chain[-1]
+
+    def peek(self, level: str, topic_tree_request: TopicTreeRequest) -> str:
+        """
+        Wie ``select``, aber ohne den Zustand des Routers zu verändern (kein Auslösen oder Zurücksetzen eines Modells,
+        keine neuen Einträge in ``metrics``). Für Schätzungen wie den Probelauf.
+        """
+        chain = self.chain(level, topic_tree_request)
+        now = time.time()
+        for model in chain:
+            state = self._states.get(model)
+            if state is None:
+                return model
+            if state.tripped_at is not None:
+                if not self._is_cooling_down(state, now):
+                    return model
+            elif not self._exceeds_thresholds(state):
+                return model
+        return chain[-1]
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        """Begrenzt die gleichzeitigen Aufrufe eines Modells auf ``MODEL_MAX_CONCURRENCY``."""
+        state = self._state(model)
+        if state.semaphore is None:
+            yield
+            return
+        async with state.semaphore:
+            yield
+
+    @asynccontextmanager
+    async def acquire(self, level: str, topic_tree_request: TopicTreeRequest):
+        """
+        Wählt das Modell der Ebene (``select``) und wartet auf dessen ``slot``; liefert das gewählte Modell.
+        Nach dem Warten wird erneut gewählt: Hat das Modell inzwischen seine Schwellen überschritten, wird der Slot
+        wieder freigegeben und auf das neue Modell gewartet. So wechseln auch bereits wartende Aufrufe (z.B. alle
+        Aufrufe einer Ebene, die per ``asyncio.gather`` gleichzeitig starten) auf das Fallback-Modell.
+        """
+        model = self.select(level, topic_tree_request)
+        while True:
+            async with self.slot(model):
+                selected = self.select(level, topic_tree_request)
+                if selected == model:
+                    yield model
+                    return
+            model = selected
+
+    @asynccontextmanager
+    async def track(self, model: str):
+        """Erfasst Latenz und Fehler eines Aufrufs (ohne die Wartezeit auf ``slot`` bzw. ``llm_slot``)."""
+        state = self._state(model)
+        state.in_flight += 1
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            state.in_flight -= 1
+            state.calls += 1
+            state.errors += 0 if ok else 1
+            state.window.append((time.perf_counter() - started, ok))
+
+    def metrics(self) -> List[ModelMetrics]:
+        now = time.time()
+        return [
+            ModelMetrics(
+                model=model,
+                calls=state.calls,
+                errors=state.errors,
+                in_flight=state.in_flight,
+                max_concurrency=state.max_concurrency,
+                error_rate=round(state.error_rate(), 4),
+                p50_latency_seconds=state.p50_latency(),
+                p95_latency_seconds=state.p95_latency(),
+                healthy=not self._is_cooling_down(state, now),
+            )
+            for model, state in self._states.items()
+        ]
+
+
+@lru_cache
+def get_model_router() -> ModelRouter:
+    """Liest die Routing-Konfiguration beim ersten Zugriff (also nach ``load_dotenv()``)."""
+    return ModelRouter.from_env()
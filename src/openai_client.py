@@ -0,0 +1,23 @@
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+def get_openai_key():
+    """Liest den OpenAI-API-Key aus den Umgebungsvariablen."""
+    return os.getenv("OPENAI_API_KEY", "")
+
+
+@lru_cache
+def get_openai_client() -> "AsyncOpenAI":
+    """
+    Gemeinsamer ``AsyncOpenAI``-Client für alle Anfragen (und die Vorberechnung), damit der Connection-Pool
+    wiederverwendet wird statt pro Anfrage neue TLS-Verbindungen aufzubauen.
+    ``openai`` wird erst hier importiert (bzw. vorher im Warm-up, siehe ``src/warmup.py``).
+    """
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=get_openai_key())
@@ -0,0 +1,327 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+from pydantic import BaseModel
+
+from src.DTOs.collection import Collection
+from src.DTOs.topic_tree_request import TopicTreeRequest
+from src.topic_tree_generator import generate_collections, missing_expansions
+from src.topic_tree_planner import calls_per_level
+from src.tracing import start_trace
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# Felder, die keinen Effekt auf die Generierung haben und erst beim Ausliefern gesetzt werden
+_READ_TIME_FIELDS = {"discipline_uri", "educational_context_uri"}
+
+
+class CachedTree(BaseModel):
+    """Ein vorberechneter Themenbaum (ohne URIs) samt Zeitpunkt der Generierung."""
+
+    request: TopicTreeRequest
+    generated_at: float
+    collections: List[Collection]
+
+
+def normalize_request(topic_tree_request: TopicTreeRequest) -> TopicTreeRequest:
+    """Entfernt die URIs, die erst beim Ausliefern gesetzt werden (siehe ``build_topic_tree``)."""
+    return topic_tree_request.model_copy(update={field: None for field in _READ_TIME_FIELDS})
+
+
+def request_key(topic_tree_request: TopicTreeRequest) -> str:
+    """
+    Normalisierter Schlüssel einer Anfrage: URIs werden ignoriert,
+    das Thema wird unabhängig von Groß-/Kleinschreibung und Leerzeichen verglichen.
+    ``model`` gehört zum Schlüssel (``None`` = Routing per ``MODEL_ROUTES``, sonst festes Modell).
+    """
+    data = topic_tree_request.model_dump(exclude=_READ_TIME_FIELDS)
+    data["theme"] = " ".join(data["theme"].split()).casefold()
+    return json.dumps(data, sort_keys=True, ensure_ascii=False)
+
+
+def _write_entry(path: Path, entry: CachedTree) -> None:
+    try:
+        path.write_text(entry.model_dump_json(), encoding="utf-8")
+    except OSError as e:
+        logger.warning(f"Could not write precomputed topic tree '{path}': {e}")
+
+
+class PopularTreeCache:
+    """
+    Zählt, wie oft welche (normalisierte) ``TopicTreeRequest`` angefragt wird, und hält die Top-N Bäume
+    vorberechnet bereit (stale-while-revalidate).
+
+    - frisch (jünger als ``ttl_seconds``): wird direkt ausgeliefert
+    - veraltet (jünger als ``max_stale_seconds``): wird direkt ausgeliefert, im Hintergrund neu generiert
+    - älter: gilt als nicht vorhanden
+
+    Ohne Budget (``calls_per_hour`` = 0) kann nichts neu generiert werden; veraltete Bäume gelten dann ebenfalls
+    als nicht vorhanden, d.h. es werden nur frische Bäume aus bisherigen Anfragen ausgeliefert.
+
+    Der Scheduler generiert nur Anfragen, die mindestens ``min_requests`` Mal gestellt wurden.
+    Hintergrund-Generierungen dürfen insgesamt höchstens ``calls_per_hour`` Chat-Completion-Aufrufe pro Stunde
+    verbrauchen. Die URIs (``discipline_uri`` / ``educational_context_uri``) werden erst beim Ausliefern gesetzt.
+    """
+
+    def __init__(
+        self,
+        top_n: int = 0,
+        ttl_seconds: float = 24 * 3600,
+        max_stale_seconds: float = 7 * 24 * 3600,
+        calls_per_hour: int = 0,
+        interval_seconds: float = 300,
+        store_dir: Optional[str] = None,
+        min_requests: int = 2,
+        max_tracked: int = 1000,
+    ):
+        self.top_n = top_n
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.calls_per_hour = calls_per_hour
+        self.interval_seconds = interval_seconds
+        self.store_dir = Path(store_dir) if store_dir else None
+        self.min_requests = min_requests
+        self.max_tracked = max_tracked
+
+        self._counts: Counter = Counter()
+        self._requests: Dict[str, TopicTreeRequest] = {}
+        self._entries: Dict[str, CachedTree] = {}
+        self._spent_calls: Deque[Tuple[float, int]] = deque()
+        self._in_flight: Set[str] = set()
+        self._client_factory: Optional[Callable[[], "AsyncOpenAI"]] = None
+        self._client: Optional["AsyncOpenAI"] = None
+        self._scheduler: Optional[asyncio.Task] = None
+        self._loading: Optional[asyncio.Task] = None
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls) -> "PopularTreeCache":
+        """
+        Liest die Konfiguration aus den Umgebungsvariablen.
+        Ohne ``PRECOMPUTE_TOP_N`` (bzw. mit 0) ist die Vorberechnung deaktiviert.
+        """
+        return cls(
+            top_n=int(os.getenv("PRECOMPUTE_TOP_N", "0")),
+            ttl_seconds=float(os.getenv("PRECOMPUTE_TTL_SECONDS", str(24 * 3600))),
+            max_stale_seconds=float(os.getenv("PRECOMPUTE_MAX_STALE_SECONDS", str(7 * 24 * 3600))),
+            calls_per_hour=int(os.getenv("PRECOMPUTE_CALLS_PER_HOUR", "0")),
+            interval_seconds=float(os.getenv("PRECOMPUTE_INTERVAL_SECONDS", "300")),
+            store_dir=os.getenv("PRECOMPUTE_STORE_DIR") or None,
+            min_requests=int(os.getenv("PRECOMPUTE_MIN_REQUESTS", "2")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.top_n > 0
+
+    @property
+    def max_age_seconds(self) -> float:
+        """Höchstes Alter, bis zu dem ein Baum ausgeliefert wird (ohne Budget kein stale-while-revalidate)."""
+        return self.max_stale_seconds if self.calls_per_hour > 0 else self.ttl_seconds
+
+    # --------------------------------------------------------------------------
+    # Anfrage-Statistik
+    # --------------------------------------------------------------------------
+
+    def record(self, topic_tree_request: TopicTreeRequest) -> None:
+        """Zählt eine eingehende Anfrage."""
+        if not self.enabled:
+            return
+        key = request_key(topic_tree_request)
+        self._counts[key] += 1
+        self._requests.setdefault(key, normalize_request(topic_tree_request))
+        if len(self._counts) > self.max_tracked:
+            # seltenste Anfragen vergessen, damit die Statistik nicht unbegrenzt wächst
+            for rare_key, _ in self._counts.most_common()[self.max_tracked :]:
+                del self._counts[rare_key]
+                if rare_key not in self._entries:
+                    self._requests.pop(rare_key, None)
+
+    def top_keys(self) -> List[str]:
+        return [key for key, _ in self._counts.most_common(self.top_n)]
+
+    # --------------------------------------------------------------------------
+    # Lesen / Schreiben
+    # --------------------------------------------------------------------------
+
+    def get(self, topic_tree_request: TopicTreeRequest) -> Optional[List[Collection]]:
+        """
+        Liefert die vorberechneten Collections (ohne URIs) oder ``None``.
+        Ist der Eintrag veraltet, wird (im Rahmen des Budgets) eine Neugenerierung im Hintergrund angestoßen.
+        """
+        if not self.enabled:
+            return None
+        key = request_key(topic_tree_request)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        age = time.time() - entry.generated_at
+        if age >= self.max_age_seconds:
+            return None
+        if age >= self.ttl_seconds:
+            logger.info(f"Serving stale precomputed topic tree (age: {age:.0f}s), revalidating in background")
+            self._schedule_refresh(key)
+        return entry.collections
+
+    def contains(self, topic_tree_request: TopicTreeRequest) -> bool:
+        """True, falls ``get`` einen (frischen oder noch auslieferbaren veralteten) Baum liefern würde."""
+        if not self.enabled:
+            return False
+        entry = self._entries.get(request_key(topic_tree_request))
+        return entry is not None and time.time() - entry.generated_at < self.max_age_seconds
+
+    def put(self, topic_tree_request: TopicTreeRequest, collections: List[Collection]) -> None:
+        """Speichert einen (frisch generierten) Baum, sofern die Anfrage zu den Top-N gehört und er vollständig ist."""
+        if not self.enabled or not collections:
+            return
+        key = request_key(topic_tree_request)
+        if key not in self.top_keys():
+            return
+        self._store(key, collections)
+
+    def _store(self, key: str, collections: List[Collection]) -> None:
+        # unvollständige Bäume (fehlgeschlagene Expansionen) nicht für TTL bzw. max_stale_seconds festhalten
+        missing = missing_expansions(collections, self._requests[key])
+        if missing:
+            logger.warning(f"Not caching incomplete topic tree ({missing} failed expansions)")
+            return
+        entry = CachedTree(request=self._requests[key], generated_at=time.time(), collections=collections)
+        self._entries[key] = entry
+        if self.store_dir:
+            path = self.store_dir / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+            # im Hintergrund-Thread schreiben, damit der Event-Loop (und damit die Anfrage) nicht blockiert wird
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                _write_entry(path, entry)
+                return
+            loop.run_in_executor(None, _write_entry, path, entry)
+
+    def _read_store(self) -> List[CachedTree]:
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.store_dir.glob("*.json"):
+            try:
+                entries.append(CachedTree.model_validate_json(path.read_text(encoding="utf-8")))
+            except ValueError as e:
+                logger.warning(f"Ignoring unreadable precomputed topic tree '{path}': {e}")
+        return entries
+
+    async def _load_store(self) -> None:
+        """Liest den lokalen Speicher in einem Thread, damit der Server währenddessen schon antwortet."""
+        if not self.store_dir:
+            return
+        try:
+            entries = await asyncio.to_thread(self._read_store)
+        except OSError as e:
+            logger.warning(f"Could not load precomputed topic trees from '{self.store_dir}': {e}")
+            return
+        for entry in entries:
+            key = request_key(entry.request)
+            # ein während des Ladens bereits neu generierter Baum hat Vorrang
+            self._entries.setdefault(key, entry)
+            self._requests.setdefault(key, entry.request)
+        logger.info(f"Loaded {len(entries)} precomputed topic trees from '{self.store_dir}'")
+
+    async def wait_loaded(self) -> None:
+        """Wartet, bis der lokale Speicher geladen ist (Teil des Warm-ups, siehe ``src/warmup.py``)."""
+        if self._loading is not None:
+            await asyncio.shield(self._loading)
+
+    # --------------------------------------------------------------------------
+    # Hintergrund-Generierung
+    # --------------------------------------------------------------------------
+
+    def _take_budget(self, calls: int) -> bool:
+        """Reserviert ``calls`` Aufrufe aus dem stündlichen Budget (gleitendes Fenster)."""
+        now = time.time()
+        while self._spent_calls and now - self._spent_calls[0][0] >= 3600:
+            self._spent_calls.popleft()
+        spent = sum(c for _, c in self._spent_calls)
+        if spent + calls > self.calls_per_hour:
+            return False
+        self._spent_calls.append((now, calls))
+        return True
+
+    def _schedule_refresh(self, key: str) -> None:
+        if self._client_factory is None or key in self._in_flight:
+            return
+        if not self._take_budget(sum(calls_per_level(self._requests[key]).values())):
+            logger.debug("Refresh budget exhausted, skipping background revalidation")
+            return
+        self._in_flight.add(key)
+        task = asyncio.create_task(self._refresh(key))
+        # Referenz halten, damit der Task nicht vorzeitig vom Garbage Collector entfernt wird
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _refresh(self, key: str) -> None:
+        topic_tree_request = self._requests[key]
+        try:
+            if self._client is None:
+                self._client = self._client_factory()
+            logger.info(f"Precomputing topic tree for '{topic_tree_request.theme}' ...")
+            with start_trace("precompute_topic_tree", theme=topic_tree_request.theme):
+                collections = await generate_collections(self._client, topic_tree_request)
+            if collections:
+                self._store(key, collections)
+            else:
+                logger.warning(f"Precomputing topic tree for '{topic_tree_request.theme}' returned no main topics")
+        except Exception as e:
+            logger.error(f"Error while precomputing topic tree for '{topic_tree_request.theme}': {e}")
+        finally:
+            self._in_flight.discard(key)
+
+    async def _run(self) -> None:
+        # erst nach dem Laden planen, sonst würden gespeicherte Bäume als fehlend neu generiert
+        await self.wait_loaded()
+        while True:
+            now = time.time()
+            due = [
+                key
+                for key in self.top_keys()
+                # einmalige Anfragen werden nur beim Ausliefern gespeichert, nicht im Hintergrund generiert
+                if self._counts[key] >= self.min_requests
+                and key not in self._in_flight
+                and (key not in self._entries or now - self._entries[key].generated_at >= self.ttl_seconds)
+            ]
+            # fehlende Bäume zuerst, danach die ältesten
+            due.sort(key=lambda k: self._entries[k].generated_at if k in self._entries else 0.0)
+            for key in due:
+                if not self._take_budget(sum(calls_per_level(self._requests[key]).values())):
+                    break
+                self._in_flight.add(key)
+                await self._refresh(key)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self, client_factory: Callable[[], "AsyncOpenAI"]) -> None:
+        """Startet das Laden des lokalen Speichers und den Hintergrund-Scheduler (falls aktiviert)."""
+        if not self.enabled:
+            return
+        self._client_factory = client_factory
+        self._loading = asyncio.create_task(self._load_store())
+        if self.calls_per_hour > 0:
+            self._scheduler = asyncio.create_task(self._run())
+            logger.info(
+                f"Started topic tree precomputation (top {self.top_n}, budget: {self.calls_per_hour} calls/hour)"
+            )
+
+    async def stop(self) -> None:
+        """Bricht den Scheduler und laufende Hintergrund-Aktualisierungen (stale-while-revalidate) ab."""
+        tasks = list(self._background_tasks)
+        for task in (self._loading, self._scheduler):
+            if task is not None:
+                tasks.append(task)
+        self._loading = self._scheduler = None
+        for task in tasks:
+            task.cancel()
+        # ``return_exceptions`` sammelt die ``CancelledError`` der abgebrochenen Tasks ein
+        await asyncio.gather(*tasks, return_exceptions=True)
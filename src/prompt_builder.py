@@ -0,0 +1,24 @@
+from typing import List
+
+from src.prompts import BASE_INSTRUCTIONS, TREE_CONTEXT_TEMPLATE
+
+
+class PromptBuilder:
+    """
+    Baut die Chat-Nachrichten für alle Aufrufe eines Themenbaums.
+
+    Die System-Nachricht (Formatierungsregeln + Baum-Kontext) ist für alle Aufrufe
+    eines Baums byte-identisch und steht immer am Anfang. Nur die User-Nachricht
+    (knotenspezifischer Suffix) ändert sich. So kann der Provider den gemeinsamen
+    Präfix cachen (siehe ``usage.prompt_tokens_details.cached_tokens``).
+    """
+
+    def __init__(self, theme: str):
+        self.theme = theme
+        self.prefix = BASE_INSTRUCTIONS + "\n" + TREE_CONTEXT_TEMPLATE.format(themenbaumthema=theme)
+
+    def build_messages(self, suffix: str) -> List[dict]:
+        """
+        Liefert die Nachrichtenliste ``[system: stabiler Präfix, user: knotenspezifischer Suffix]``.
+        """
+        return [{"role": "system", "content": self.prefix}, {"role": "user", "content": suffix}]
@@ -47,64 +47,54 @@ BASE_INSTRUCTIONS = (
 )
 
 # ------------------------------------------------------------------------------
-# 5) Prompt-Templates (Mehrschritt-Generierung)
-#   -> Keine Erwähnung mehr von Fach/Bildungsstufe
+# 5) Baum-Kontext (stabiler, cachebarer Prompt-Präfix)
+#   -> wird für alle Aufrufe eines Themenbaums identisch an BASE_INSTRUCTIONS angehängt,
+#      damit der Provider den gemeinsamen Präfix wiederverwenden kann (Prompt-Caching)
 # ------------------------------------------------------------------------------
 
-MAIN_PROMPT_TEMPLATE = """\
-Erstelle eine Liste von {num_main} Hauptthemen 
-für das Thema "{themenbaumthema}".
+TREE_CONTEXT_TEMPLATE = """\
+THEMENBAUM-KONTEXT:
+Alle folgenden Anfragen beziehen sich auf den Themenbaum "{themenbaumthema}".
 
+AUSGABEFORMAT:
 Keine Code-Fences, kein Markdown, nur reines JSON-Array.
 
-Folgende Titel sind bereits vergeben: {existing_titles}
-
-{special_instructions}
-
 Erwarte ein JSON-Array dieser Form:
 [
   {{
-    "title": "Name des Hauptthemas",
+    "title": "Name des Themas",
     "shorttitle": "Kurzer Titel",
-    "description": "Ausführliche Beschreibung des Themas",
-    "keywords": ["Schlagwort1", "Schlagwort2", "Schlagwort3"]
+    "description": "Beschreibung des Themas",
+    "keywords": ["Schlagwort1", "Schlagwort2"]
   }}
 ]
 
-WICHTIG: 
-- Die "description" muss eine ausführliche Beschreibung des Themas enthalten
+WICHTIG:
+- Die "description" muss eine Beschreibung des Themas enthalten
 - Die "keywords" Liste muss mindestens 2-3 relevante Schlagworte enthalten
 - Keine leeren Felder zurückgeben
 """
+
+# ------------------------------------------------------------------------------
+# 6) Prompt-Templates (Mehrschritt-Generierung, knotenspezifischer Suffix)
+#   -> Keine Erwähnung mehr von Fach/Bildungsstufe
+#   -> Alles, was für den ganzen Baum gleich bleibt, gehört in TREE_CONTEXT_TEMPLATE
+# ------------------------------------------------------------------------------
+
+MAIN_PROMPT_TEMPLATE = """\
+Erstelle eine Liste von {num_main} Hauptthemen 
+für das Thema "{themenbaumthema}".
+Die "description" muss eine ausführliche Beschreibung des Themas enthalten.
+
+Folgende Titel sind bereits vergeben: {existing_titles}
+
+{special_instructions}
+"""
 SUB_PROMPT_TEMPLATE = """\
 Erstelle eine Liste von {num_sub} Unterthemen für das Hauptthema "{main_theme}"
 im Kontext "{themenbaumthema}".
-
-Keine Code-Fences, kein Markdown, nur reines JSON-Array.
-
-Erwarte ein JSON-Array dieser Form:
-[
-  {{
-    "title": "Name des Unterthemas",
-    "shorttitle": "Kurzer Titel",
-    "description": "Beschreibung",
-    "keywords": ["Schlagwort1", "Schlagwort2"]
-  }}
-]
 """
 LP_PROMPT_TEMPLATE = """\
 Erstelle eine Liste von {num_lp} Lehrplanthemen für das Unterthema "{sub_theme}"
 im Kontext "{themenbaumthema}".
-
-Keine Code-Fences, kein Markdown, nur reines JSON-Array.
-
-Erwarte ein JSON-Array dieser Form:
-[
-  {{
-    "title": "Name des Lehrplanthemas",
-    "shorttitle": "Kurzer Titel",
-    "description": "Beschreibung",
-    "keywords": ["Schlagwort1", "Schlagwort2"]
-  }}
-]
 """
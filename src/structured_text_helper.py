@@ -1,29 +1,64 @@
 import json
-from typing import Optional, List
+import time
+from contextlib import AsyncExitStack
+from typing import TYPE_CHECKING, Optional, List
 
 import backoff
 from loguru import logger
-from openai import RateLimitError, APIError, OpenAI, AsyncOpenAI
 from pydantic import ValidationError
 
 from src.DTOs.collection import Collection
 from src.DTOs.properties import Properties
-from src.prompts import BASE_INSTRUCTIONS
+from src.DTOs.topic_tree_request import TopicTreeRequest
+from src.llm_limits import llm_slot
+from src.model_router import get_model_router
+from src.token_usage import TokenUsage
+from src.tracing import record_backoff, span
 
+if TYPE_CHECKING:
+    # ``openai`` ist teuer zu importieren und wird erst beim Warm-up bzw. beim ersten Client geladen
+    from openai import AsyncOpenAI, OpenAI
 
-@backoff.on_exception(backoff.expo, (RateLimitError, APIError), max_tries=5, jitter=backoff.full_jitter)
-def generate_structured_text(client: OpenAI, prompt: str, model: str) -> Optional[List[Collection]]:
+# Obergrenze der Completion-Tokens pro Aufruf (auch Grundlage für die Schätzungen des Planers)
+MAX_COMPLETION_TOKENS = 2000
+
+
+def is_retryable(e: Exception) -> bool:
+    """
+    True für vorübergehende Fehler von OpenAI, die per ``backoff`` wiederholt werden: Rate-Limits,
+    Verbindungsfehler / Timeouts und Serverfehler (Status >= 500). Fehler wie 400 (z.B. unbekanntes Modell)
+    oder 401 (falscher API-Key) werden nicht wiederholt.
+    """
+    from openai import APIConnectionError, APIStatusError, RateLimitError
+
+    # ``APITimeoutError`` ist eine Unterklasse von ``APIConnectionError``
+    if isinstance(e, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(e, APIStatusError) and e.status_code >= 500
+
+
+def _is_not_retryable(e: Exception) -> bool:
+    return not is_retryable(e)
+
+
+@backoff.on_exception(backoff.expo, Exception, giveup=_is_not_retryable, max_tries=5, jitter=backoff.full_jitter)
+def generate_structured_text(
+    client: "OpenAI", messages: List[dict], model: str, usage: Optional[TokenUsage] = None, label: str = ""
+) -> Optional[List[Collection]]:
     """
-    Schickt die Prompt-Anfrage an das angegebene OpenAI-Modell
+    Schickt die (per ``PromptBuilder`` gebauten) Nachrichten an das angegebene OpenAI-Modell
     und parst das zurückgegebene reine JSON-Array in eine Liste von Collection-Objekten.
+    Falls ``usage`` übergeben wird, wird dort der Token-Verbrauch des Aufrufs (inkl. ``cached_tokens``) erfasst.
     """
     try:
         resp = client.chat.completions.create(
             model=model,
-            messages=[{"role": "system", "content": BASE_INSTRUCTIONS}, {"role": "user", "content": prompt}],
-            max_tokens=2000,
+            messages=messages,
+            max_tokens=MAX_COMPLETION_TOKENS,
             temperature=0.7,
         )
+        if usage is not None:
+            usage.record(resp, label=label)
         content = resp.choices[0].message.content
         if not content.strip():
             raise Exception("The AI model returned an empty response.")
@@ -31,7 +66,7 @@ def generate_structured_text(client: OpenAI, prompt: str, model: str) -> Optiona
         # Entfernt mögliche Triple-Backticks oder JSON-Syntax, die stören könnten
         raw = content.strip().strip("```").strip("```json").strip()
         # Debug-Ausgabe
-        print(f"Raw response: {raw}")
+        logger.debug("Raw response: {}", raw)
         data = json.loads(raw)
 
         # Falls nur ein Dict zurückkam, in eine Liste packen
@@ -78,55 +113,115 @@ def generate_structured_text(client: OpenAI, prompt: str, model: str) -> Optiona
         raise Exception(f"Fehler bei der Anfrage: {e}")
 
 
-@backoff.on_exception(backoff.expo, (RateLimitError, APIError), max_tries=5, jitter=backoff.full_jitter)
-async def generate_structured_text_async(client: AsyncOpenAI, prompt: str, model: str) -> Optional[List[Collection]]:
+async def generate_structured_text_async(
+    client: "AsyncOpenAI",
+    messages: List[dict],
+    level: str,
+    topic_tree_request: TopicTreeRequest,
+    usage: Optional[TokenUsage] = None,
+    label: str = "",
+) -> Optional[List[Collection]]:
     """
-    Schickt die Prompt-Anfrage an das angegebene OpenAI-Modell (asynchron)
+    Schickt die (per ``PromptBuilder`` gebauten) Nachrichten an das OpenAI-Modell der Ebene ``level`` (asynchron)
     und parst das zurückgegebene reine JSON-Array in eine Liste von Collection-Objekten.
+    Falls ``usage`` übergeben wird, wird dort der Token-Verbrauch des Aufrufs (inkl. ``cached_tokens``) erfasst.
+
+    Das Modell wählt der ``ModelRouter`` bei jedem Versuch neu, d.h. auch Retries und noch nicht gestartete Aufrufe
+    wechseln auf das Fallback-Modell, sobald das primäre Modell seine Schwellen überschreitet.
+    Vorübergehende Fehler (siehe ``is_retryable``) werden mit exponentiellem Backoff wiederholt. Schlägt auch der
+    letzte Versuch fehl, wird (wie bei allen anderen Fehlern) eine leere Liste zurückgegeben,
+    um ``asyncio.gather`` nicht abzubrechen.
     """
+    with span("expand", label=label, level=level):
+        try:
+            return await _generate_structured_text_attempt(client, messages, level, topic_tree_request, usage, label)
+        except Exception as e:
+            # ``_generate_structured_text_attempt`` reicht nur vorübergehende Fehler weiter (siehe ``is_retryable``)
+            logger.error(f"OpenAI API Error in async call (giving up after retries): {e}")
+            return []
+
+
+@backoff.on_exception(
+    backoff.expo,
+    Exception,
+    giveup=_is_not_retryable,
+    max_tries=5,
+    jitter=backoff.full_jitter,
+    on_backoff=record_backoff,
+)
+async def _generate_structured_text_attempt(
+    client: "AsyncOpenAI",
+    messages: List[dict],
+    level: str,
+    topic_tree_request: TopicTreeRequest,
+    usage: Optional[TokenUsage],
+    label: str,
+) -> Optional[List[Collection]]:
+    """Ein einzelner Versuch von ``generate_structured_text_async``; vorübergehende Fehler gehen an ``backoff``."""
+    model_router = get_model_router()
     try:
-        resp = await client.chat.completions.create(
-            model=model,
-            messages=[{"role": "system", "content": BASE_INSTRUCTIONS}, {"role": "user", "content": prompt}],
-            max_tokens=2000,
-            temperature=0.7,
-        )
+        async with AsyncExitStack() as stack:
+            with span("queue_wait"):
+                # erst der Slot des Modells, dann der globale: wer auf ein ausgelastetes Modell wartet,
+                # blockiert so keine globalen Slots für Aufrufe an andere Modelle
+                model = await stack.enter_async_context(model_router.acquire(level, topic_tree_request))
+                await stack.enter_async_context(llm_slot())
+            await stack.enter_async_context(model_router.track(model))
+            with span("chat_completion", model=model):
+                started = time.perf_counter()
+                resp = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=MAX_COMPLETION_TOKENS,
+                    temperature=0.7,
+                )
+                latency_seconds = time.perf_counter() - started
+        if usage is not None:
+            usage.record(
+                resp,
+                label=label,
+                prompt_chars=sum(len(m["content"]) for m in messages),
+                latency_seconds=latency_seconds,
+            )
         content = resp.choices[0].message.content
         if not content.strip():
             logger.warning("The AI model returned an empty response.")
             return []
 
-        # Entfernt mögliche Triple-Backticks oder JSON-Syntax, die stören könnten
-        raw = content.strip().strip("```").strip("```json").strip()
-        data = json.loads(raw)
-
-        if not isinstance(data, list):
-            data = [data]
-
-        results = []
-        for item in data:
-            title = item.get("title", "")
-            shorttitle = item.get("shorttitle", "")
-            desc = item.get("description", "")
-            keywords = item.get("keywords", [])
-
-            if not desc:
-                desc = f"Beschreibung für {title}"
-            if not keywords:
-                keywords = [title.lower()]
-
-            prop = Properties(
-                cclom_general_keyword=keywords,
-                ccm_collectionshorttitle=[shorttitle],
-                ccm_educationalcontext=[],
-                ccm_educationalintendedenduserrole=["http://w3id.org/openeduhub/vocabs/intendedEndUserRole/teacher"],
-                ccm_taxonid=[],
-                cm_description=[desc],
-                cm_title=[title],
-            )
-
-            c = Collection(title=title, shorttitle=shorttitle, properties=prop, subcollections=[])
-            results.append(c)
+        with span("parse"):
+            # Entfernt mögliche Triple-Backticks oder JSON-Syntax, die stören könnten
+            raw = content.strip().strip("```").strip("```json").strip()
+            data = json.loads(raw)
+
+            if not isinstance(data, list):
+                data = [data]
+
+            results = []
+            for item in data:
+                title = item.get("title", "")
+                shorttitle = item.get("shorttitle", "")
+                desc = item.get("description", "")
+                keywords = item.get("keywords", [])
+
+                if not desc:
+                    desc = f"Beschreibung für {title}"
+                if not keywords:
+                    keywords = [title.lower()]
+
+                prop = Properties(
+                    cclom_general_keyword=keywords,
+                    ccm_collectionshorttitle=[shorttitle],
+                    ccm_educationalcontext=[],
+                    ccm_educationalintendedenduserrole=[
+                        "http://w3id.org/openeduhub/vocabs/intendedEndUserRole/teacher"
+                    ],
+                    ccm_taxonid=[],
+                    cm_description=[desc],
+                    cm_title=[title],
+                )
+
+                c = Collection(title=title, shorttitle=shorttitle, properties=prop, subcollections=[])
+                results.append(c)
 
         return results
     except json.JSONDecodeError as jde:
@@ -136,5 +231,7 @@ async def generate_structured_text_async(client: AsyncOpenAI, prompt: str, model
         logger.error(f"Validation Error in async call: {ve}")
         return []
     except Exception as e:
+        if is_retryable(e):
+            raise
         logger.error(f"General Error in async call: {e}")
         return []
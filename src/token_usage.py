@@ -0,0 +1,122 @@
+from typing import Dict, List
+
+from pydantic import BaseModel, Field
+
+from src.logging_config import log_node
+
+
+class CallUsage(BaseModel):
+    """Token-Verbrauch eines einzelnen Chat-Completion-Aufrufs."""
+
+    label: str
+    prompt_tokens: int
+    cached_tokens: int
+    completion_tokens: int
+    prompt_chars: int = 0
+    latency_seconds: float = 0.0
+
+    @property
+    def level(self) -> str:
+        """Ebene des Aufrufs (``main``, ``sub`` oder ``lp``), abgeleitet aus dem Label."""
+        return self.label.split(":", 1)[0]
+
+
+class TokenUsage(BaseModel):
+    """
+    Sammelt den Token-Verbrauch (inkl. ``cached_tokens``) aller Aufrufe eines Themenbaums.
+    """
+
+    calls: List[CallUsage] = Field(default_factory=list)
+
+    def record(self, resp, label: str = "", prompt_chars: int = 0, latency_seconds: float = 0.0) -> None:
+        """
+        Übernimmt ``resp.usage`` einer Chat-Completion-Antwort.
+        Fehlt die Usage-Angabe (z.B. bei Mock-Servern), wird der Aufruf ignoriert.
+        """
+        usage = getattr(resp, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        call = CallUsage(
+            label=label,
+            prompt_tokens=usage.prompt_tokens or 0,
+            cached_tokens=cached_tokens,
+            completion_tokens=usage.completion_tokens or 0,
+            prompt_chars=prompt_chars,
+            latency_seconds=latency_seconds,
+        )
+        self.calls.append(call)
+        log_node(
+            call.level,
+            "Usage for '{}': prompt_tokens={}, cached_tokens={}, completion_tokens={}",
+            label,
+            call.prompt_tokens,
+            call.cached_tokens,
+            call.completion_tokens,
+            severity="DEBUG",
+        )
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(c.prompt_tokens for c in self.calls)
+
+    @property
+    def cached_tokens(self) -> int:
+        return sum(c.cached_tokens for c in self.calls)
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(c.completion_tokens for c in self.calls)
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        """Anteil der Prompt-Tokens, die aus dem Provider-Cache kamen (0.0 bis 1.0)."""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "calls": len(self.calls),
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache_hit_ratio": round(self.cache_hit_ratio, 4),
+        }
+
+
+class LevelHistory(BaseModel):
+    """Aufsummierter Verbrauch aller bisherigen Aufrufe einer Ebene."""
+
+    calls: int = 0
+    requested_items: int = 0
+    prompt_tokens: int = 0
+    prompt_chars: int = 0
+    completion_tokens: int = 0
+    latency_seconds: float = 0.0
+
+
+class UsageHistory(BaseModel):
+    """
+    Historischer Verbrauch pro Ebene (``main``, ``sub``, ``lp``) über alle generierten Themenbäume.
+    Dient als Grundlage für die Schätzungen des Planers (``/generate-topic-tree/plan``).
+    """
+
+    levels: Dict[str, LevelHistory] = Field(default_factory=dict)
+
+    def add(self, usage: TokenUsage, requested_items: Dict[str, int]) -> None:
+        """
+        Übernimmt alle Aufrufe eines Themenbaums.
+        ``requested_items`` enthält pro Ebene die angefragte Anzahl an Themen pro Aufruf.
+        """
+        for call in usage.calls:
+            history = self.levels.setdefault(call.level, LevelHistory())
+            history.calls += 1
+            history.requested_items += requested_items.get(call.level, 0)
+            history.prompt_tokens += call.prompt_tokens
+            history.prompt_chars += call.prompt_chars
+            history.completion_tokens += call.completion_tokens
+            history.latency_seconds += call.latency_seconds
+
+
+# prozessweite Historie, wird nach jedem generierten Themenbaum ergänzt
+usage_history = UsageHistory()
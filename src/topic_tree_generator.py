@@ -0,0 +1,190 @@
+import asyncio
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List
+
+from loguru import logger
+
+from src.DTOs.collection import Collection
+from src.DTOs.properties import Properties
+from src.DTOs.topic_tree_request import TopicTreeRequest
+from src.logging_config import log_node
+from src.prompt_builder import PromptBuilder
+from src.prompts import MAIN_PROMPT_TEMPLATE, SUB_PROMPT_TEMPLATE, LP_PROMPT_TEMPLATE
+from src.structured_text_helper import generate_structured_text_async
+from src.token_usage import TokenUsage, usage_history
+from src.tracing import span
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+def requested_items_per_level(topic_tree_request: TopicTreeRequest) -> Dict[str, int]:
+    """Angefragte Anzahl an Themen pro Aufruf, je Ebene."""
+    return {
+        "main": topic_tree_request.num_main_topics,
+        "sub": topic_tree_request.num_subtopics,
+        "lp": topic_tree_request.num_curriculum_topics,
+    }
+
+
+async def generate_collections(client: "AsyncOpenAI", topic_tree_request: TopicTreeRequest) -> List[Collection]:
+    """
+    Generiert die Collections (Haupt-, Unter- und Lehrplanthemen) eines Themenbaums per LLM.
+
+    Die URIs aus ``discipline_uri`` / ``educational_context_uri`` werden hier bewusst **nicht** gesetzt,
+    sondern erst in ``build_topic_tree``, damit das Ergebnis für verschiedene URIs wiederverwendet werden kann.
+    Liefert eine leere Liste, falls keine Hauptthemen generiert werden konnten.
+    """
+    # stabiler Präfix (Regeln + Baum-Kontext) für alle Aufrufe dieses Baums -> Prompt-Caching beim Provider
+    prompt_builder = PromptBuilder(theme=topic_tree_request.theme)
+    usage = TokenUsage()
+
+    # 1) Spezialanweisungen für Hauptthemen (z.B. Allgemeines, Methodik etc.)
+    special_instructions = []
+    if topic_tree_request.include_general_topic:
+        special_instructions.append("1) Hauptthema 'Allgemeines' an erster Stelle")
+    if topic_tree_request.include_methodology_topic:
+        special_instructions.append("2) Hauptthema 'Methodik und Didaktik' an letzter Stelle")
+    special_instructions = "\n".join(special_instructions) if special_instructions else "Keine besonderen Anweisungen."
+
+    logger.info("Generating {} main topics ('Hauptthemen') ...", topic_tree_request.num_main_topics)
+
+    # 2) Hauptthemen generieren
+    with span("level:main"):
+        main_topics = await generate_structured_text_async(
+            client=client,
+            messages=prompt_builder.build_messages(
+                MAIN_PROMPT_TEMPLATE.format(
+                    themenbaumthema=topic_tree_request.theme,
+                    num_main=topic_tree_request.num_main_topics,
+                    existing_titles="",
+                    special_instructions=special_instructions,
+                )
+            ),
+            level="main",
+            topic_tree_request=topic_tree_request,
+            usage=usage,
+            label="main",
+        )
+
+    if not main_topics:
+        return []
+
+    logger.info("Received main topics ('Hauptthemen'). Beginning generation of sub topics ('Unterthemen') next.")
+
+    # 3) Unterthemen für jedes Hauptthema asynchron generieren
+    sub_topic_tasks = []
+    for main_topic in main_topics:
+        log_node("sub", "Creating subtopic generation task for '{}'", main_topic.title)
+        prompt = SUB_PROMPT_TEMPLATE.format(
+            themenbaumthema=topic_tree_request.theme,
+            main_theme=main_topic.title,
+            num_sub=topic_tree_request.num_subtopics,
+        )
+        task = generate_structured_text_async(
+            client=client,
+            messages=prompt_builder.build_messages(prompt),
+            level="sub",
+            topic_tree_request=topic_tree_request,
+            usage=usage,
+            label=f"sub:{main_topic.title}",
+        )
+        sub_topic_tasks.append(task)
+
+    # die Tasks werden erst in ``asyncio.gather`` erstellt und erben dort den Level-Span als Eltern-Span
+    with span("level:sub", calls=len(sub_topic_tasks)):
+        sub_topics_results = await asyncio.gather(*sub_topic_tasks)
+
+    for i, main_topic in enumerate(main_topics):
+        sub_topics = sub_topics_results[i]
+        if sub_topics:
+            main_topic.subcollections = sub_topics
+
+    # 4) Lehrplanthemen für jedes Unterthema asynchron generieren
+    lp_tasks = []
+    for main_topic in main_topics:
+        for sub_topic in main_topic.subcollections:
+            log_node("lp", "Creating curriculum generation task for '{}'", sub_topic.title)
+            prompt = LP_PROMPT_TEMPLATE.format(
+                themenbaumthema=topic_tree_request.theme,
+                main_theme=main_topic.title,
+                sub_theme=sub_topic.title,
+                num_lp=topic_tree_request.num_curriculum_topics,
+            )
+            task = generate_structured_text_async(
+                client=client,
+                messages=prompt_builder.build_messages(prompt),
+                level="lp",
+                topic_tree_request=topic_tree_request,
+                usage=usage,
+                label=f"lp:{sub_topic.title}",
+            )
+            lp_tasks.append((main_topic, sub_topic, task))
+
+    with span("level:lp", calls=len(lp_tasks)):
+        lp_results = await asyncio.gather(*[task for _, _, task in lp_tasks])
+
+    for i, (main_topic, sub_topic, _) in enumerate(lp_tasks):
+        lp_topics = lp_results[i]
+        if lp_topics:
+            sub_topic.subcollections = lp_topics
+
+    logger.opt(lazy=True).info(
+        "Token usage for topic tree '{}': {}", lambda: topic_tree_request.theme, lambda: usage.summary()
+    )
+    usage_history.add(usage, requested_items=requested_items_per_level(topic_tree_request))
+    return main_topics
+
+
+def missing_expansions(main_topics: List[Collection], topic_tree_request: TopicTreeRequest) -> int:
+    """
+    Anzahl der Knoten ohne Unterknoten, obwohl welche angefragt wurden, d.h. deren Expansion fehlgeschlagen ist
+    (z.B. weil nach Rate-Limits oder Serverfehlern alle Versuche aufgebraucht waren und ``[]`` zurückkam).
+    """
+    missing = 0
+    for main_topic in main_topics:
+        if topic_tree_request.num_subtopics and not main_topic.subcollections:
+            missing += 1
+        if topic_tree_request.num_curriculum_topics:
+            missing += sum(1 for sub_topic in main_topic.subcollections or [] if not sub_topic.subcollections)
+    return missing
+
+
+def _with_uris(topic: Collection, topic_tree_request: TopicTreeRequest) -> Collection:
+    """
+    Liefert eine Kopie des Knotens (rekursiv), deren Properties die (ggf.) übergebenen URIs enthalten.
+    Der übergebene Knoten bleibt unverändert, damit vorberechnete Bäume mehrfach ausgeliefert werden können.
+    """
+    return Collection(
+        title=topic.title,
+        shorttitle=topic.shorttitle,
+        properties=Properties(
+            cm_title=[topic.title],
+            ccm_collectionshorttitle=[topic.shorttitle],
+            cm_description=topic.properties.cm_description,
+            cclom_general_keyword=topic.properties.cclom_general_keyword,
+            ccm_taxonid=topic_tree_request.discipline_uri or topic.properties.ccm_taxonid,
+            ccm_educationalcontext=topic_tree_request.educational_context_uri
+            or topic.properties.ccm_educationalcontext,
+        ),
+        subcollections=[_with_uris(sub, topic_tree_request) for sub in topic.subcollections or []],
+    )
+
+
+def build_topic_tree(main_topics: List[Collection], topic_tree_request: TopicTreeRequest) -> dict:
+    """
+    Setzt die (ggf.) übergebenen URIs in die Properties aller Knoten
+    und strukturiert die finalen Daten (Metadaten + Collection-Liste).
+    """
+    with span("assemble", main_topics=len(main_topics)):
+        return {
+            "metadata": {
+                "title": topic_tree_request.theme,
+                "description": f"Themenbaum für {topic_tree_request.theme}",
+                "target_audience": "Lehrkräfte",
+                "created_at": datetime.now().isoformat(),
+                "version": "1.0",
+                "author": "Themenbaum Generator",
+            },
+            "collection": [_with_uris(topic, topic_tree_request).to_dict() for topic in main_topics],
+        }
@@ -0,0 +1,152 @@
+import math
+from typing import Dict, Optional
+
+from src.DTOs.topic_tree_plan import LevelPlan, TopicTreePlan
+from src.DTOs.topic_tree_request import TopicTreeRequest
+from src.llm_limits import LlmLimits, get_llm_limits
+from src.model_router import get_model_router
+from src.prompt_builder import PromptBuilder
+from src.prompts import MAIN_PROMPT_TEMPLATE, SUB_PROMPT_TEMPLATE, LP_PROMPT_TEMPLATE
+from src.structured_text_helper import MAX_COMPLETION_TOKENS
+from src.token_usage import UsageHistory, usage_history
+from src.topic_tree_generator import requested_items_per_level
+
+# Annahmen, solange noch keine gemessenen Aufrufe vorliegen
+DEFAULT_CHARS_PER_TOKEN = 3.5  # deutschsprachige Prompts
+DEFAULT_OUTPUT_TOKENS_PER_ITEM = 100  # title + shorttitle + description + keywords als JSON
+DEFAULT_SECONDS_PER_CALL = 0.5  # Overhead pro Aufruf (Netzwerk, Time-to-first-token)
+DEFAULT_OUTPUT_TOKENS_PER_SECOND = 50.0
+# Platzhalter für die (noch unbekannten) Titel der Eltern-Knoten in den Prompts
+PLACEHOLDER_TITLE = "X" * 30
+
+
+def calls_per_level(topic_tree_request: TopicTreeRequest) -> Dict[str, int]:
+    """
+    Anzahl der Chat-Completion-Aufrufe pro Ebene: 1 Aufruf für die Hauptthemen,
+    1 Aufruf pro Hauptthema für die Unterthemen und 1 Aufruf pro Unterthema für die Lehrplanthemen.
+    Liefert das Modell weniger Themen als angefragt, werden entsprechend weniger Aufrufe benötigt.
+    """
+    num_main = topic_tree_request.num_main_topics
+    return {"main": 1, "sub": num_main, "lp": num_main * topic_tree_request.num_subtopics}
+
+
+def _prompt_chars(topic_tree_request: TopicTreeRequest) -> Dict[str, int]:
+    """Länge (in Zeichen) der System- und User-Nachricht eines Aufrufs, je Ebene."""
+    prefix_chars = len(PromptBuilder(theme=topic_tree_request.theme).prefix)
+    main_prompt = MAIN_PROMPT_TEMPLATE.format(
+        themenbaumthema=topic_tree_request.theme,
+        num_main=topic_tree_request.num_main_topics,
+        existing_titles="",
+        special_instructions="1) Hauptthema 'Allgemeines' an erster Stelle",
+    )
+    sub_prompt = SUB_PROMPT_TEMPLATE.format(
+        themenbaumthema=topic_tree_request.theme,
+        main_theme=PLACEHOLDER_TITLE,
+        num_sub=topic_tree_request.num_subtopics,
+    )
+    lp_prompt = LP_PROMPT_TEMPLATE.format(
+        themenbaumthema=topic_tree_request.theme,
+        main_theme=PLACEHOLDER_TITLE,
+        sub_theme=PLACEHOLDER_TITLE,
+        num_lp=topic_tree_request.num_curriculum_topics,
+    )
+    return {
+        "main": prefix_chars + len(main_prompt),
+        "sub": prefix_chars + len(sub_prompt),
+        "lp": prefix_chars + len(lp_prompt),
+    }
+
+
+def _level_seconds(calls: int, tokens: int, seconds_per_call: float, concurrency: int, limits: LlmLimits) -> float:
+    """
+    Dauer einer Ebene: alle Aufrufe einer Ebene laufen parallel (begrenzt durch ``concurrency``, 0 = unbegrenzt),
+    die Ebenen selbst nacheinander. Die Rate-Limits des Providers setzen eine Untergrenze.
+    """
+    if calls == 0:
+        return 0.0
+    waves = math.ceil(calls / concurrency) if concurrency else 1
+    seconds = waves * seconds_per_call
+    if limits.requests_per_minute:
+        seconds = max(seconds, calls / limits.requests_per_minute * 60)
+    if limits.tokens_per_minute:
+        seconds = max(seconds, tokens / limits.tokens_per_minute * 60)
+    return seconds
+
+
+def plan_topic_tree(
+    topic_tree_request: TopicTreeRequest,
+    history: UsageHistory = usage_history,
+    limits: Optional[LlmLimits] = None,
+    served_from_cache: bool = False,
+) -> TopicTreePlan:
+    """
+    Schätzt Aufrufe, Tokens und Dauer eines Themenbaums, ohne das LLM aufzurufen.
+
+    Prompt-Tokens werden aus der Länge der tatsächlich gebauten Prompts geschätzt,
+    Completion-Tokens und Latenz aus den bisher gemessenen Aufrufen (``resp.usage``) der jeweiligen Ebene.
+    """
+    limits = limits or get_llm_limits()
+    model_router = get_model_router()
+    calls = calls_per_level(topic_tree_request)
+    prompt_chars = _prompt_chars(topic_tree_request)
+    requested_items = requested_items_per_level(topic_tree_request)
+
+    total_prompt_tokens = sum(h.prompt_tokens for h in history.levels.values())
+    total_prompt_chars = sum(h.prompt_chars for h in history.levels.values())
+    chars_per_token = total_prompt_chars / total_prompt_tokens if total_prompt_tokens else DEFAULT_CHARS_PER_TOKEN
+
+    levels = []
+    for level in ("main", "sub", "lp"):
+        level_history = history.levels.get(level)
+        input_tokens_per_call = math.ceil(prompt_chars[level] / chars_per_token)
+
+        if level_history and level_history.requested_items:
+            output_tokens_per_item = level_history.completion_tokens / level_history.requested_items
+        else:
+            output_tokens_per_item = DEFAULT_OUTPUT_TOKENS_PER_ITEM
+        output_tokens_per_call = min(
+            math.ceil(output_tokens_per_item * max(requested_items[level], 1)), MAX_COMPLETION_TOKENS
+        )
+
+        if level_history and level_history.calls and level_history.completion_tokens:
+            # gemessene Latenz, skaliert auf die erwartete Antwortlänge
+            avg_latency = level_history.latency_seconds / level_history.calls
+            avg_output_tokens = level_history.completion_tokens / level_history.calls
+            seconds_per_call = avg_latency * output_tokens_per_call / avg_output_tokens
+        else:
+            seconds_per_call = DEFAULT_SECONDS_PER_CALL + output_tokens_per_call / DEFAULT_OUTPUT_TOKENS_PER_SECOND
+
+        # gleichzeitige Aufrufe: globales Limit und Limit des (aktuell gewählten) Modells der Ebene
+        model = model_router.peek(level, topic_tree_request)
+        concurrency = min(
+            (c for c in (limits.max_concurrency, model_router.max_concurrency.get(model, 0)) if c), default=0
+        )
+
+        input_tokens = input_tokens_per_call * calls[level]
+        output_tokens = output_tokens_per_call * calls[level]
+        levels.append(
+            LevelPlan(
+                level=level,
+                model=model,
+                calls=calls[level],
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                estimated_seconds=round(
+                    _level_seconds(calls[level], input_tokens + output_tokens, seconds_per_call, concurrency, limits), 2
+                ),
+            )
+        )
+
+    # ein vorberechneter Baum wird ohne LLM-Aufrufe ausgeliefert; ``levels`` zeigt weiterhin den Aufwand einer
+    # Neugenerierung (z.B. für die nächste Hintergrund-Aktualisierung)
+    charged = [] if served_from_cache else levels
+    return TopicTreePlan(
+        levels=levels,
+        total_calls=sum(p.calls for p in charged),
+        total_input_tokens=sum(p.input_tokens for p in charged),
+        total_output_tokens=sum(p.output_tokens for p in charged),
+        estimated_seconds=round(sum(p.estimated_seconds for p in charged), 2),
+        limits=limits,
+        based_on_history=bool(history.levels),
+        served_from_cache=served_from_cache,
+    )
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+import random
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+SERVICE_NAME = "topic-tree-generator"
+
+
+class TracingSettings(BaseModel):
+    """
+    Einstellungen für das Tracing (``TRACE_*``-Umgebungsvariablen).
+    Ohne ``TRACE_SAMPLE_RATE`` (bzw. mit 0) werden keine Spans aufgezeichnet, die Trace-ID wird trotzdem vergeben.
+    """
+
+    sample_rate: float = Field(0.0, ge=0.0, le=1.0, description="Anteil der aufgezeichneten Traces (0.0 bis 1.0)")
+    export_dir: Optional[str] = Field(None, description="Verzeichnis, in das jeder Trace als OTLP-JSON-Datei geht")
+    export_url: Optional[str] = Field(None, description="OTLP/HTTP-Endpunkt (JSON), z.B. .../v1/traces")
+
+    @classmethod
+    def from_env(cls) -> "TracingSettings":
+        return cls(
+            sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0")),
+            export_dir=os.getenv("TRACE_EXPORT_DIR") or None,
+            export_url=os.getenv("TRACE_EXPORT_URL") or None,
+        )
+
+
+@lru_cache
+def get_tracing_settings() -> TracingSettings:
+    """Liest die Einstellungen beim ersten Zugriff (also nach ``load_dotenv()``)."""
+    return TracingSettings.from_env()
+
+
+class Span(BaseModel):
+    """Ein abgeschlossener Abschnitt eines Traces (Zeitangaben in Nanosekunden seit Epoch)."""
+
+    span_id: str
+    parent_span_id: Optional[str] = None
+    name: str
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict = Field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class Trace(BaseModel):
+    trace_id: str
+    sampled: bool
+    spans: List[Span] = Field(default_factory=list)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    """
+    Startet einen neuen Trace mit Root-Span ``name``. Nach Abschluss wird der Trace (falls gesampelt) exportiert.
+    Alle innerhalb des Blocks erstellten asyncio-Tasks erben den Trace über ``contextvars``.
+    """
+    settings = get_tracing_settings()
+    trace = Trace(trace_id=secrets.token_hex(16), sampled=random.random() < settings.sample_rate)
+    trace_token = _current_trace.set(trace)
+    # ein Trace, der innerhalb eines anderen gestartet wird (z.B. eine Hintergrund-Aktualisierung, deren Task
+    # aus einer Anfrage heraus erstellt wurde), bekommt einen eigenen Root-Span ohne Eltern-Span
+    span_token = _current_span.set(None)
+    try:
+        # die Trace-ID wird allen Log-Meldungen dieser Anfrage als ``extra["trace_id"]`` mitgegeben
+        with logger.contextualize(trace_id=trace.trace_id), span(name, **attributes):
+            yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        if trace.sampled:
+            _export(trace, settings)
+            logger.debug(f"Recorded trace {trace.trace_id} ({len(trace.spans)} spans, root: {name})")
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Zeichnet einen Span als Kind des aktuellen Spans auf. Außerhalb eines (gesampelten) Traces ein No-op.
+    Exceptions werden am Span vermerkt und weitergereicht.
+    """
+    trace = _current_trace.get()
+    if trace is None or not trace.sampled:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(
+        span_id=secrets.token_hex(8),
+        parent_span_id=parent.span_id if parent else None,
+        name=name,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    span_token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(span_token)
+        current.end_ns = time.time_ns()
+        trace.spans.append(current)
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes) -> None:
+    """Zeichnet einen Span mit bekannten Zeitpunkten auf (z.B. die Wartezeit vor einem Backoff-Retry)."""
+    trace = _current_trace.get()
+    if trace is None or not trace.sampled:
+        return
+    parent = _current_span.get()
+    trace.spans.append(
+        Span(
+            span_id=secrets.token_hex(8),
+            parent_span_id=parent.span_id if parent else None,
+            name=name,
+            start_ns=start_ns,
+            end_ns=end_ns,
+            attributes=attributes,
+        )
+    )
+
+
+def record_backoff(details: dict) -> None:
+    """``on_backoff``-Handler für ``backoff``: zeichnet die Wartezeit vor dem nächsten Versuch als Span auf."""
+    start_ns = time.time_ns()
+    record_span(
+        "backoff_retry",
+        start_ns,
+        start_ns + int(details["wait"] * 1e9),
+        tries=details["tries"],
+        wait_seconds=details["wait"],
+        exception=repr(details.get("exception")),
+    )
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace: Trace) -> dict:
+    """Konvertiert einen Trace ins OTLP/JSON-Format (``ExportTraceServiceRequest``)."""
+    spans = []
+    for s in trace.spans:
+        otlp_span = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            # STATUS_CODE_OK = 1, STATUS_CODE_ERROR = 2
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_span_id:
+            otlp_span["parentSpanId"] = s.parent_span_id
+        spans.append(otlp_span)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }
+        ]
+    }
+
+
+def _write(trace: Trace, settings: TracingSettings) -> None:
+    # erst hier importiert, damit ``requests`` den Start des Servers nicht verlangsamt
+    import requests
+
+    payload = to_otlp(trace)
+    try:
+        if settings.export_dir:
+            export_dir = Path(settings.export_dir)
+            export_dir.mkdir(parents=True, exist_ok=True)
+            (export_dir / f"{trace.trace_id}.json").write_text(json.dumps(payload), encoding="utf-8")
+        if settings.export_url:
+            requests.post(settings.export_url, json=payload, timeout=5)
+    except (OSError, requests.RequestException) as e:
+        logger.warning(f"Could not export trace {trace.trace_id}: {e}")
+
+
+def _export(trace: Trace, settings: TracingSettings) -> None:
+    """Exportiert den Trace im Hintergrund-Thread, damit der Event-Loop nicht blockiert wird."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _write(trace, settings)
+        return
+    loop.run_in_executor(None, _write, trace, settings)
@@ -0,0 +1,126 @@
+import asyncio
+import importlib
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import FastAPI
+from loguru import logger
+
+from src.DTOs.collection import Collection
+from src.DTOs.readiness import Readiness
+from src.DTOs.topic_tree_request import TopicTreeRequest
+from src.openai_client import get_openai_client, get_openai_key
+from src.topic_tree_generator import build_topic_tree
+
+# Beispielknoten, an dem die pydantic-Validierung und -Serialisierung einmal durchlaufen wird
+SAMPLE_COLLECTION = {
+    "title": "Mechanik",
+    "shorttitle": "Mech",
+    "properties": {
+        "cclom_general_keyword": ["mechanik"],
+        "ccm_collectionshorttitle": ["Mech"],
+        "ccm_educationalcontext": [],
+        "ccm_educationalintendedenduserrole": ["http://w3id.org/openeduhub/vocabs/intendedEndUserRole/teacher"],
+        "ccm_taxonid": [],
+        "cm_description": ["Beschreibung für Mechanik"],
+        "cm_title": ["Mechanik"],
+    },
+    "subcollections": [],
+}
+
+
+class Warmup:
+    """
+    Wärmt den Prozess nach dem Start im Hintergrund auf, damit die erste echte Anfrage nicht die Kosten trägt:
+
+    1. ``openai`` importieren (in einem Thread, der Event-Loop beantwortet währenddessen ``/_ping``)
+    2. OpenAPI-Schema erzeugen und die pydantic-Modelle einmal validieren / serialisieren
+    3. den gemeinsamen ``AsyncOpenAI``-Client erzeugen und ``openai_connections`` Verbindungen zur API öffnen
+    4. zusätzliche Schritte abwarten, z.B. das Laden der vorberechneten Themenbäume
+
+    Bis alle Schritte abgeschlossen sind, meldet ``/_ready`` 503. Fehlschläge (z.B. API nicht erreichbar) werden
+    nur geloggt, der Prozess gilt danach trotzdem als bereit.
+    """
+
+    def __init__(self, openai_connections: int = 1, timeout_seconds: float = 10):
+        self.openai_connections = openai_connections
+        self.timeout_seconds = timeout_seconds
+        self.steps: Dict[str, float] = {}
+        self.seconds: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "Warmup":
+        """
+        ``WARMUP_OPENAI_CONNECTIONS``: Anzahl vorab geöffneter Verbindungen zur OpenAI-API (0 = aus),
+        ``WARMUP_TIMEOUT_SECONDS``: maximale Wartezeit auf diese Verbindungen.
+        """
+        return cls(
+            openai_connections=int(os.getenv("WARMUP_OPENAI_CONNECTIONS", "1")),
+            timeout_seconds=float(os.getenv("WARMUP_TIMEOUT_SECONDS", "10")),
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self.seconds is not None
+
+    def readiness(self) -> Readiness:
+        return Readiness(
+            status="ok" if self.ready else "warming up",
+            warmup_seconds=self.seconds,
+            steps=self.steps,
+        )
+
+    @contextmanager
+    def _step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            logger.warning(f"Warm-up step '{name}' failed: {e}")
+        finally:
+            self.steps[name] = round(time.perf_counter() - started, 4)
+
+    async def _open_connections(self) -> None:
+        # ein leichter Aufruf pro Verbindung; httpx hält die Verbindungen danach im Pool
+        # (allerdings nur bis zum Keep-Alive-Timeout, d.h. sie helfen der ersten Anfrage nach dem Start)
+        client = get_openai_client()
+        await asyncio.wait_for(
+            asyncio.gather(*(client.models.list() for _ in range(self.openai_connections))),
+            timeout=self.timeout_seconds,
+        )
+
+    async def _run(self, app: FastAPI, extra_steps: Dict[str, Callable[[], Awaitable[None]]]) -> None:
+        started = time.perf_counter()
+        with self._step("import_openai"):
+            await asyncio.to_thread(importlib.import_module, "openai")
+        with self._step("schemas"):
+            app.openapi()
+            topic_tree_request = TopicTreeRequest.model_validate({"theme": "Physik"})
+            build_topic_tree([Collection.model_validate(SAMPLE_COLLECTION)], topic_tree_request)
+        if get_openai_key():
+            with self._step("openai_client"):
+                get_openai_client()
+            if self.openai_connections > 0:
+                with self._step("openai_connections"):
+                    await self._open_connections()
+        for name, step in extra_steps.items():
+            with self._step(name):
+                await step()
+        self.seconds = round(time.perf_counter() - started, 4)
+        logger.info(f"Warm-up finished after {self.seconds:.2f}s: {self.steps}")
+
+    def start(self, app: FastAPI, extra_steps: Optional[Dict[str, Callable[[], Awaitable[None]]]] = None) -> None:
+        """Startet das Warm-up als Hintergrund-Task (der Server nimmt währenddessen schon Verbindungen an)."""
+        self._task = asyncio.create_task(self._run(app, extra_steps or {}))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None